@@ -601,10 +601,8 @@ class TestStateRegisterRunBatchId:
             batch_id="batch-test-12345678",
         )
 
-        state_path = tmp_path / ".kit" / "cloud-state.json"
-        assert state_path.exists()
-        data = json.loads(state_path.read_text())
-        entry = data["active_runs"]["run-batch-test-1"]
+        assert (tmp_path / ".kit" / "cloud-state.jsonl").exists()
+        entry = project_state.get_run(project_root, "run-batch-test-1")
         assert entry["batch_id"] == "batch-test-12345678"
 
     def test_state_register_run_without_batch_id_defaults_empty(self, tmp_path):
@@ -619,8 +617,7 @@ class TestStateRegisterRunBatchId:
             instance_type="c7a.8xlarge",
         )
 
-        data = json.loads((tmp_path / ".kit" / "cloud-state.json").read_text())
-        entry = data["active_runs"]["run-no-batch"]
+        entry = project_state.get_run(project_root, "run-no-batch")
         assert entry.get("batch_id", "") == "", "Missing batch_id should default to empty string"
 
     def test_state_register_run_backward_compatible(self, tmp_path):
@@ -935,7 +932,7 @@ class TestRemoteRunBatchId:
         monkeypatch.setattr(remote, "_generate_run_id", lambda: "cloud-batch-test-001")
         monkeypatch.setattr(remote.s3_helper, "get_run_s3_prefix", lambda rid: f"s3://b/{rid}")
         monkeypatch.setattr(remote.s3_helper, "upload_code", lambda *a: None)
-        monkeypatch.setattr(remote.s3_helper, "check_exit_code", lambda rid: 0)
+        monkeypatch.setattr(remote.s3_helper, "describe_markers", lambda rid: {"exit_code": 0, "heartbeat": None})
         monkeypatch.setattr(remote.s3_helper, "download_results", lambda *a, **kw: None)
         monkeypatch.setattr(project_state, "register_run", mock_register_run)
         monkeypatch.setattr(project_state, "remove_run", lambda *a: None)
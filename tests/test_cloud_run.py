@@ -6,7 +6,9 @@ import json
 import os
 import sys
 import tempfile
+import time
 import unittest
+import warnings
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from unittest import mock
@@ -87,6 +89,40 @@ def _instance_entry(instance_id, run_id, spec="", launched_at="", state="running
     }
 
 
+def _mock_s3_client(objects=None):
+    """Return a mock boto3 S3 client backed by a {key: bytes} dict."""
+    objects = {} if objects is None else objects
+    client = mock.MagicMock()
+    client.exceptions.NoSuchKey = type("NoSuchKey", (Exception,), {})
+
+    def get_object(Bucket, Key, **kwargs):
+        if Key not in objects:
+            raise client.exceptions.NoSuchKey(Key)
+        body = mock.MagicMock()
+        body.read.return_value = objects[Key]
+        return {"Body": body, "ContentLength": len(objects[Key])}
+
+    def put_object(Bucket, Key, Body, **kwargs):
+        objects[Key] = Body
+
+    def head_object(Bucket, Key, **kwargs):
+        if Key not in objects:
+            raise client.exceptions.ClientError({"Error": {"Code": "404"}})
+        return {"ContentLength": len(objects[Key])}
+
+    def copy_object(Bucket, Key, CopySource, **kwargs):
+        objects[Key] = objects[CopySource["Key"]]
+
+    client.exceptions.ClientError = type(
+        "ClientError", (Exception,), {"__init__": lambda self, r: setattr(self, "response", r)},
+    )
+    client.get_object.side_effect = get_object
+    client.put_object.side_effect = put_object
+    client.head_object.side_effect = head_object
+    client.copy_object.side_effect = copy_object
+    return client
+
+
 # ---------------------------------------------------------------------------
 # TestAWSTagging
 # ---------------------------------------------------------------------------
@@ -262,7 +298,7 @@ class TestSpecDuplicateDetection(unittest.TestCase):
              mock.patch.object(remote, "_load_state", return_value={"status": "running", "run_id": "cloud-test-ad", "project_root": "/tmp/fake"}), \
              mock.patch.object(remote, "_generate_run_id", return_value="cloud-test-ad"), \
              mock.patch.object(remote.s3_helper, "upload_code"), \
-             mock.patch.object(remote.s3_helper, "check_exit_code", return_value=0), \
+             mock.patch.object(remote.s3_helper, "describe_markers", return_value={"exit_code": 0, "heartbeat": None}), \
              mock.patch.object(remote.s3_helper, "download_results"), \
              mock.patch.object(remote.project_state, "register_run"), \
              mock.patch.object(remote.project_state, "remove_run"):
@@ -290,7 +326,7 @@ class TestSpecDuplicateDetection(unittest.TestCase):
              mock.patch.object(remote, "_load_state", return_value={"status": "running", "run_id": "cloud-test-ns", "project_root": "/tmp/fake"}), \
              mock.patch.object(remote, "_generate_run_id", return_value="cloud-test-ns"), \
              mock.patch.object(remote.s3_helper, "upload_code"), \
-             mock.patch.object(remote.s3_helper, "check_exit_code", return_value=0), \
+             mock.patch.object(remote.s3_helper, "describe_markers", return_value={"exit_code": 0, "heartbeat": None}), \
              mock.patch.object(remote.s3_helper, "download_results"), \
              mock.patch.object(remote.project_state, "register_run"), \
              mock.patch.object(remote.project_state, "remove_run"):
@@ -306,6 +342,639 @@ class TestSpecDuplicateDetection(unittest.TestCase):
         backend.find_instances_by_spec.assert_not_called()
         backend.provision.assert_called_once()
 
+    def test_aws_spec_lookup_filters_state_server_side(self):
+        ec2 = _mock_ec2_client()
+        paginator = mock.MagicMock()
+        paginator.paginate.return_value = [{"Reservations": [{"Instances": [
+            _instance_entry("i-run", "run-a", spec="specs/x.md", state="running"),
+        ]}]}]
+        ec2.get_paginator.return_value = paginator
+        backend = _make_aws_backend(ec2=ec2)
+
+        running = backend.find_instances_by_spec("specs/x.md")
+        self.assertEqual([d["instance_id"] for d in running], ["i-run"])
+        filters = paginator.paginate.call_args.kwargs["Filters"]
+        self.assertIn({"Name": "instance-state-name", "Values": ["running", "pending"]}, filters)
+
+
+# ---------------------------------------------------------------------------
+# TestBackendCache
+# ---------------------------------------------------------------------------
+
+class TestBackendCache(unittest.TestCase):
+    """Verify backends are created once per backend name and reused."""
+
+    def test_backend_instance_reused_across_runs(self):
+        from cloud import remote
+        fake_cls = mock.MagicMock()
+        with mock.patch.dict(remote._BACKENDS, clear=True), \
+             mock.patch.object(remote, "_get_backend_cls", return_value=fake_cls):
+            first = remote._get_backend_for_run({"backend": "aws"})
+            second = remote._get_backend_for_run({"backend": "aws"})
+
+        self.assertIs(first, second)
+        fake_cls.assert_called_once_with()
+
+    def test_unknown_backend_raises(self):
+        from cloud import remote
+        with mock.patch.dict(remote._BACKENDS, clear=True):
+            with self.assertRaises(ValueError):
+                remote._get_backend_for_run({"backend": "nope"})
+
+
+# ---------------------------------------------------------------------------
+# TestHeartbeat
+# ---------------------------------------------------------------------------
+
+class TestHeartbeat(unittest.TestCase):
+    """Verify heartbeat parsing and staleness reporting in poll_status."""
+
+    def test_epoch_and_legacy_iso_bodies(self):
+        from cloud import s3
+        self.assertEqual(s3._heartbeat_epoch("1767225600"), 1767225600)
+        self.assertEqual(s3._heartbeat_epoch("2026-01-01T00:00:00Z"), 1767225600)
+
+    def test_poll_status_flags_stale_heartbeat(self):
+        from cloud import remote
+        import time
+        stale = {"timestamp": "", "ts_epoch": int(time.time()) - 900, "age_seconds": 900}
+        with mock.patch.object(remote, "_load_state", return_value={
+                 "run_id": "cloud-hb", "status": "running", "instance_id": None}), \
+             mock.patch.object(remote.s3_helper, "describe_markers",
+                               return_value={"exit_code": None, "heartbeat": stale}):
+            result = remote.poll_status("cloud-hb")
+
+        self.assertEqual(result["status"], "running")
+        self.assertGreaterEqual(result["heartbeat_age_seconds"], 900)
+        self.assertEqual(result["warning"], "heartbeat_stale")
+
+
+# ---------------------------------------------------------------------------
+# TestStateFiles
+# ---------------------------------------------------------------------------
+
+class TestStateFiles(unittest.TestCase):
+    """Verify per-run state files are read and written via the state-dir fd."""
+
+    def setUp(self):
+        from cloud import remote
+        self._tmpdir = tempfile.mkdtemp()
+        self.state_dir = Path(self._tmpdir) / "state"
+        patcher = mock.patch.object(remote, "STATE_DIR", str(self.state_dir))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self._reset_fd()
+        self.addCleanup(self._reset_fd)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def _reset_fd(self):
+        from cloud import remote
+        if remote._STATE_FD is not None:
+            os.close(remote._STATE_FD)
+            remote._STATE_FD = None
+
+    def test_round_trip_via_dir_fd(self):
+        from cloud import remote
+        if not remote._USE_STATE_DIR_FD:
+            self.skipTest("dir_fd not supported on this platform")
+        remote._save_state("run-a", {"status": "running"})
+        self.assertIsNotNone(remote._STATE_FD)
+        self.assertTrue((self.state_dir / "run-a.json").exists())
+        self.assertEqual(remote._load_state("run-a"), {"status": "running"})
+
+    def test_path_fallback_without_dir_fd(self):
+        from cloud import remote
+        with mock.patch.object(remote, "_USE_STATE_DIR_FD", False):
+            remote._save_state("run-b", {"status": "running"})
+            self.assertIsNone(remote._STATE_FD)
+            self.assertEqual(remote._load_state("run-b"), {"status": "running"})
+        self.assertTrue((self.state_dir / "run-b.json").exists())
+
+    def test_removed_state_dir_is_reopened(self):
+        import shutil
+        from cloud import remote
+        if not remote._USE_STATE_DIR_FD:
+            self.skipTest("dir_fd not supported on this platform")
+        remote._save_state("run-c", {"status": "running"})
+        shutil.rmtree(self.state_dir)
+
+        remote._save_state("run-d", {"status": "pending"})
+        self.assertTrue((self.state_dir / "run-d.json").exists())
+        with self.assertRaises(FileNotFoundError):
+            remote._load_state("run-c")
+
+
+# ---------------------------------------------------------------------------
+# TestS3Markers
+# ---------------------------------------------------------------------------
+
+class TestS3Markers(unittest.TestCase):
+    """Verify marker reads/writes go through the shared boto3 client."""
+
+    def test_exit_code_roundtrip(self):
+        from cloud import s3
+        client = _mock_s3_client()
+        with mock.patch.object(s3, "_get_s3_client", return_value=client):
+            self.assertIsNone(s3.check_exit_code("run-m"))
+            s3.write_marker("run-m", "exit_code", "3\n")
+            self.assertEqual(s3.check_exit_code("run-m"), 3)
+
+    def test_heartbeat_missing_returns_none(self):
+        from cloud import s3
+        with mock.patch.object(s3, "_get_s3_client", return_value=_mock_s3_client()):
+            self.assertIsNone(s3.check_heartbeat("run-m"))
+
+    def test_describe_markers_reads_directly_when_listing_fails(self):
+        from cloud import s3
+        client = _mock_s3_client({s3._s3_key("run-m", "exit_code"): b"0\n"})
+        with mock.patch.object(s3, "_get_s3_client", return_value=client), \
+                mock.patch.object(s3, "list_run_markers", side_effect=Exception("denied")):
+            result = s3.describe_markers("run-m")
+        self.assertEqual(result, {"exit_code": 0, "heartbeat": None})
+
+    def test_cli_fallback_skips_boto3(self):
+        from cloud import s3
+        done = mock.MagicMock(returncode=0, stdout="7\n")
+        with mock.patch.object(s3, "S3_USE_CLI", True), \
+                mock.patch.object(s3, "_get_s3_client") as client, \
+                mock.patch.object(s3.subprocess, "run", return_value=done) as run:
+            s3.write_marker("run-m", "exit_code", "7\n")
+            self.assertEqual(s3.check_exit_code("run-m"), 7)
+        client.assert_not_called()
+        self.assertEqual(run.call_args_list[0][0][0][:4], ["aws", "s3", "cp", "-"])
+
+
+# ---------------------------------------------------------------------------
+# TestCodeUpload
+# ---------------------------------------------------------------------------
+
+class TestCodeUpload(unittest.TestCase):
+    """Verify unchanged trees reuse the content-addressed code tarball."""
+
+    def test_unchanged_tree_skips_upload(self):
+        from cloud import s3
+        objects = {}
+        client = _mock_s3_client(objects)
+
+        def upload(fileobj, key, **kwargs):
+            objects[key] = fileobj.read()
+
+        with tempfile.TemporaryDirectory() as d, \
+                mock.patch.object(s3, "_get_s3_client", return_value=client), \
+                mock.patch.object(s3, "_git_tracked_files", return_value=["a.py"]), \
+                mock.patch.object(s3, "_upload_fileobj", side_effect=upload) as up:
+            Path(d, "a.py").write_text("print(1)\n")
+            s3.upload_code(d, "run-1")
+            s3.upload_code(d, "run-2")
+
+        self.assertEqual(up.call_count, 1)
+        code_keys = [k for k in objects if k.startswith("cloud-code/")]
+        self.assertEqual(len(code_keys), 1)
+        self.assertEqual(objects["cloud-runs/run-2/code.tar"], objects[code_keys[0]])
+        self.assertEqual(objects["cloud-runs/run-1/code_ref"], objects["cloud-runs/run-2/code_ref"])
+
+    def test_failed_archive_is_not_stored(self):
+        from cloud import s3
+        objects = {}
+        client = _mock_s3_client(objects)
+
+        def upload(fileobj, key, **kwargs):
+            data = b""
+            while True:
+                chunk = fileobj.read(1 << 16)
+                if not chunk:
+                    break
+                data += chunk
+            objects[key] = data
+
+        def partial_tar(root, files, output, suffix):
+            output.write(b"PARTIAL")
+            raise OSError("unreadable file")
+
+        with tempfile.TemporaryDirectory() as d, \
+                mock.patch.object(s3, "_get_s3_client", return_value=client), \
+                mock.patch.object(s3, "_git_tracked_files", return_value=["a.py"]), \
+                mock.patch.object(s3, "_upload_fileobj", side_effect=upload):
+            Path(d, "a.py").write_text("print(1)\n")
+            with mock.patch.object(s3, "_create_tar_from_list", side_effect=partial_tar):
+                with self.assertRaises(Exception):
+                    s3.upload_code(d, "run-1")
+            self.assertFalse([k for k in objects if k.startswith("cloud-code/")])
+            s3.upload_code(d, "run-2")
+
+        self.assertNotEqual(objects["cloud-runs/run-2/code.tar"], b"PARTIAL")
+
+    def test_tar_changed_files_exit_is_a_warning(self):
+        from cloud import s3
+        tar = mock.MagicMock()
+        tar.wait.return_value = 1
+        with tempfile.TemporaryDirectory() as d, \
+                tempfile.TemporaryFile() as out, \
+                mock.patch.object(s3.subprocess, "Popen", return_value=tar):
+            Path(d, "a.py").write_text("1\n")
+            with self.assertWarns(UserWarning):
+                s3._create_tar_from_list(Path(d), ["a.py"], out, ".tar")
+            tar.wait.return_value = 2
+            with self.assertRaises(RuntimeError):
+                s3._create_tar_from_list(Path(d), ["a.py"], out, ".tar")
+
+
+# ---------------------------------------------------------------------------
+# TestGitTrackedFiles
+# ---------------------------------------------------------------------------
+
+class TestGitTrackedFiles(unittest.TestCase):
+    """Verify the tracked-file listing is NUL-delimited and memoized."""
+
+    def test_memoized_until_index_changes(self):
+        import subprocess
+        from cloud import s3
+        with tempfile.TemporaryDirectory(prefix="sp ace") as d:
+            git = ["git", "-c", "user.name=t", "-c", "user.email=t@t"]
+            subprocess.run([*git, "init", "-q"], cwd=d, check=True)
+            Path(d, "a.py").write_text("1\n")
+            Path(d, "odd\nname.txt").write_text("2\n")
+            subprocess.run([*git, "add", "-A"], cwd=d, check=True)
+            subprocess.run([*git, "commit", "-qm", "init"], cwd=d, check=True)
+
+            with mock.patch.object(s3.subprocess, "run", wraps=subprocess.run) as run:
+                first = s3._git_tracked_files(Path(d))
+                second = s3._git_tracked_files(Path(d))
+                Path(d, "b.py").write_text("3\n")
+                subprocess.run([*git, "add", "b.py"], cwd=d, check=True)
+                third = s3._git_tracked_files(Path(d))
+
+            ls_calls = [c for c in run.call_args_list if "ls-files" in c.args[0]]
+            self.assertEqual(sorted(first), ["a.py", "odd\nname.txt"])
+            self.assertEqual(second, first)
+            self.assertIn("b.py", third)
+            self.assertEqual(len(ls_calls), 2)
+
+
+# ---------------------------------------------------------------------------
+# TestUploadDirs
+# ---------------------------------------------------------------------------
+
+class TestUploadDirs(unittest.TestCase):
+    """Verify data dirs are put straight to the fresh run prefix."""
+
+    def test_no_destination_listing(self):
+        from cloud import s3
+        client = mock.MagicMock()
+        with tempfile.TemporaryDirectory() as d, \
+                mock.patch.object(s3, "_get_s3_client", return_value=client), \
+                mock.patch.object(s3, "_transfer_many") as transfer:
+            Path(d, "sub").mkdir()
+            Path(d, "a.bin").write_bytes(b"12")
+            Path(d, "sub", "b.bin").write_bytes(b"345")
+            uris = s3.upload_dirs([d], "run-u")
+
+        name = Path(d).name
+        self.assertEqual(uris, [f"s3://{s3.S3_BUCKET}/cloud-runs/run-u/data/{name}/"])
+        jobs, = transfer.call_args[0][:1]
+        self.assertEqual(
+            sorted(key for _, _, key in jobs),
+            [f"cloud-runs/run-u/data/{name}/a.bin", f"cloud-runs/run-u/data/{name}/sub/b.bin"],
+        )
+        self.assertEqual(transfer.call_args.kwargs["largest_bytes"], 3)
+        client.list_objects_v2.assert_not_called()
+        client.get_paginator.assert_not_called()
+
+    def test_part_size_within_s3_limits(self):
+        import types
+        from cloud import s3
+        transfer = types.ModuleType("boto3.s3.transfer")
+        transfer.TransferConfig = lambda **kwargs: kwargs
+        modules = {"boto3": types.ModuleType("boto3"),
+                   "boto3.s3": types.ModuleType("boto3.s3"),
+                   "boto3.s3.transfer": transfer}
+        with mock.patch.dict(sys.modules, modules), \
+                mock.patch.object(s3, "_have_awscrt", return_value=False):
+            small = s3._transfer_config(object_bytes=1024)
+            huge = s3._transfer_config(object_bytes=4 * 1024 ** 4)
+        self.assertEqual(small["multipart_chunksize"], s3._MIN_PART_SIZE)
+        self.assertEqual(huge["multipart_chunksize"], s3._MAX_PART_SIZE)
+
+
+# ---------------------------------------------------------------------------
+# TestSyncDownload
+# ---------------------------------------------------------------------------
+
+class TestSyncDownload(unittest.TestCase):
+    """Verify results sync skips only files that are current locally."""
+
+    def test_sync_download_refetches_newer_object_of_same_size(self):
+        from cloud import s3
+        with tempfile.TemporaryDirectory() as d:
+            Path(d, "same.txt").write_text("old")
+            Path(d, "fresh.txt").write_text("cur")
+            old = datetime(2020, 1, 1, tzinfo=timezone.utc)
+            os.utime(Path(d, "same.txt"), (old.timestamp(), old.timestamp()))
+            newer = datetime(2021, 1, 1, tzinfo=timezone.utc)
+            paginator = mock.MagicMock()
+            paginator.paginate.return_value = [{"Contents": [
+                {"Key": "p/same.txt", "Size": 3, "LastModified": newer},
+                {"Key": "p/fresh.txt", "Size": 3, "LastModified": old},
+            ]}]
+            client = mock.MagicMock()
+            client.get_paginator.return_value = paginator
+            with mock.patch.object(s3, "_get_s3_client", return_value=client), \
+                    mock.patch.object(s3, "_transfer_many") as transfer:
+                s3._crt_sync_download("s3://bucket/p/", d)
+
+            jobs = transfer.call_args[0][0]
+            self.assertEqual([key for _, _, key in jobs], ["p/same.txt"])
+            self.assertEqual(Path(d, "same.txt").stat().st_mtime, newer.timestamp())
+
+
+# ---------------------------------------------------------------------------
+# TestS3Accelerate
+# ---------------------------------------------------------------------------
+
+class TestS3Accelerate(unittest.TestCase):
+    """Verify Transfer Acceleration is used only when the bucket supports it."""
+
+    def _sync_cmd(self, accelerated):
+        from cloud import s3
+        client = mock.MagicMock()
+        client.get_bucket_accelerate_configuration.return_value = (
+            {"Status": "Enabled"} if accelerated else {}
+        )
+        done = mock.MagicMock(returncode=0)
+        with mock.patch.object(s3, "S3_ACCELERATE", True), \
+                mock.patch.object(s3, "_ACCELERATED", None), \
+                mock.patch.object(s3, "_have_awscrt", return_value=False), \
+                mock.patch.object(s3, "_get_s3_client", return_value=client), \
+                mock.patch.object(s3.subprocess, "run", return_value=done) as run, \
+                warnings.catch_warnings(record=True):
+            warnings.simplefilter("always")
+            s3._aws_s3_sync("/tmp/x", "s3://bucket/prefix/")
+        return run.call_args[0][0]
+
+    def test_enabled_bucket_uses_accelerate_endpoint(self):
+        self.assertIn("https://s3-accelerate.amazonaws.com", self._sync_cmd(True))
+
+    def test_disabled_bucket_falls_back(self):
+        self.assertNotIn("--endpoint-url", self._sync_cmd(False))
+
+    def test_check_runs_once_when_client_creation_checks_first(self):
+        from cloud import s3
+        inner, client = mock.MagicMock(), mock.MagicMock()
+        inner.get_bucket_accelerate_configuration.return_value = {}
+
+        def get_client():  # mimics _get_s3_client() checking with its raw client
+            s3._bucket_accelerated(inner)
+            return client
+
+        with mock.patch.object(s3, "_ACCELERATED", None), \
+                mock.patch.object(s3, "_get_s3_client", side_effect=get_client), \
+                warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            self.assertFalse(s3._bucket_accelerated())
+        inner.get_bucket_accelerate_configuration.assert_called_once()
+        client.get_bucket_accelerate_configuration.assert_not_called()
+        self.assertEqual(len(caught), 1)
+
+
+# ---------------------------------------------------------------------------
+# TestTailLogFollow
+# ---------------------------------------------------------------------------
+
+class TestTailLogFollow(unittest.TestCase):
+    """Verify follow mode only fetches bytes appended since the last poll."""
+
+    def test_ranged_reads_and_partial_lines(self):
+        from cloud import s3
+        uploads = [b"a\nb\npar", b"a\nb\npartial\nc\n", b"a\nb\npartial\nc\nd"]
+        polls = {"n": 0}
+
+        def current():
+            return uploads[min(polls["n"], len(uploads) - 1)]
+
+        def head_object(Bucket, Key):
+            return {"ETag": str(len(current())), "ContentLength": len(current())}
+
+        def get_object(Bucket, Key, Range):
+            body = mock.MagicMock()
+            body.read.return_value = current()[int(Range[len("bytes="):-1]):]
+            return {"Body": body}
+
+        def check_exit_code(run_id):
+            polls["n"] += 1
+            return 0 if polls["n"] >= 2 else None
+
+        client = mock.MagicMock()
+        client.head_object.side_effect = head_object
+        client.get_object.side_effect = get_object
+        with mock.patch.object(s3, "_get_s3_client", return_value=client), \
+             mock.patch.object(s3, "check_exit_code", side_effect=check_exit_code), \
+             mock.patch.object(s3.time, "sleep"), \
+             mock.patch("builtins.print"):
+            result = s3.tail_log("run-t", lines=3, follow=True)
+
+        self.assertEqual(result, "partial\nc\nd")
+        ranges = [c.kwargs["Range"] for c in client.get_object.call_args_list]
+        self.assertEqual(ranges, ["bytes=0-", "bytes=7-", "bytes=14-"])
+
+    def test_failed_get_is_retried(self):
+        from cloud import s3
+        data = b"a\nb\n"
+        gets = {"n": 0}
+
+        def get_object(Bucket, Key, Range):
+            gets["n"] += 1
+            if gets["n"] == 1:
+                raise Exception("transient")
+            body = mock.MagicMock()
+            body.read.return_value = data[int(Range[len("bytes="):-1]):]
+            return {"Body": body}
+
+        client = mock.MagicMock()
+        client.head_object.return_value = {"ETag": "e1", "ContentLength": len(data)}
+        client.get_object.side_effect = get_object
+        with mock.patch.object(s3, "_get_s3_client", return_value=client), \
+             mock.patch.object(s3, "check_exit_code", side_effect=[None, 0]), \
+             mock.patch.object(s3.time, "sleep"), \
+             mock.patch("builtins.print"):
+            result = s3.tail_log("run-t", lines=5, follow=True)
+
+        self.assertEqual(result, "a\nb")
+        self.assertEqual(client.get_object.call_count, 2)
+
+
+# ---------------------------------------------------------------------------
+# TestNotifications
+# ---------------------------------------------------------------------------
+
+class TestNotifications(unittest.TestCase):
+    """Verify the temporary SQS watcher merges into and restores bucket config."""
+
+    def _clients(self, existing):
+        state = {"config": {"LambdaFunctionConfigurations": existing}}
+        s3c = mock.MagicMock()
+        s3c.get_bucket_notification_configuration.side_effect = (
+            lambda Bucket: json.loads(json.dumps({**state["config"], "ResponseMetadata": {}}))
+        )
+        s3c.put_bucket_notification_configuration.side_effect = (
+            lambda Bucket, NotificationConfiguration: state.update(config=NotificationConfiguration)
+        )
+        sqs = mock.MagicMock()
+        sqs.create_queue.return_value = {"QueueUrl": "https://sqs/q"}
+        sqs.get_queue_attributes.return_value = {"Attributes": {
+            "QueueArn": "arn:aws:sqs:q", "CreatedTimestamp": str(int(time.time())),
+        }}
+        return state, s3c, sqs
+
+    def test_watch_merges_and_tears_down(self):
+        from cloud import notifications
+        existing = [{"Id": "other", "LambdaFunctionArn": "arn:aws:lambda:f"}]
+        state, s3c, sqs = self._clients(existing)
+        event = {"Records": [{"s3": {"object": {"key": "cloud-runs/run-n/exit_code"}}}]}
+        sqs.receive_message.return_value = {
+            "Messages": [{"Body": json.dumps(event), "ReceiptHandle": "h"}],
+        }
+        with mock.patch.object(notifications, "_sqs_client", return_value=sqs), \
+                mock.patch.object(notifications, "_s3_client", return_value=s3c):
+            with notifications.watch_prefix("cloud-runs/run-n/") as watcher:
+                queues = state["config"]["QueueConfigurations"]
+                self.assertEqual(len(queues), 1)
+                self.assertEqual(state["config"]["LambdaFunctionConfigurations"], existing)
+                self.assertEqual(watcher.wait(), {"exit_code"})
+
+        self.assertEqual(state["config"]["QueueConfigurations"], [])
+        self.assertEqual(state["config"]["LambdaFunctionConfigurations"], existing)
+        sqs.delete_queue.assert_called_once_with(QueueUrl="https://sqs/q")
+
+    def test_setup_failure_yields_none_and_deletes_queue(self):
+        from cloud import notifications
+        state, s3c, sqs = self._clients([])
+        s3c.put_bucket_notification_configuration.side_effect = Exception("overlap")
+        with mock.patch.object(notifications, "_sqs_client", return_value=sqs), \
+                mock.patch.object(notifications, "_s3_client", return_value=s3c), \
+                mock.patch.object(notifications.log, "warning"):
+            with notifications.watch_prefix("cloud-runs/run-n/") as watcher:
+                self.assertIsNone(watcher)
+        sqs.delete_queue.assert_called_once()
+
+    def test_put_is_retried_when_overwritten_concurrently(self):
+        from cloud import notifications
+        state, s3c, sqs = self._clients([])
+        puts = []
+
+        def put(Bucket, NotificationConfiguration):
+            puts.append(NotificationConfiguration)
+            if len(puts) > 1:  # the first write loses to another session's
+                state.update(config=NotificationConfiguration)
+
+        s3c.put_bucket_notification_configuration.side_effect = put
+        with mock.patch.object(notifications, "_sqs_client", return_value=sqs), \
+                mock.patch.object(notifications, "_s3_client", return_value=s3c):
+            with notifications.watch_prefix("cloud-runs/run-n/") as watcher:
+                self.assertIsNotNone(watcher)
+                self.assertEqual(len(puts), 2)
+                self.assertEqual(len(state["config"]["QueueConfigurations"]), 1)
+
+    def test_orphaned_entries_are_pruned(self):
+        from cloud import notifications
+        state, s3c, sqs = self._clients([])
+        state["config"]["QueueConfigurations"] = [
+            {"Id": "cloud-run-tail-gone-1", "QueueArn": "arn:aws:sqs:gone"},
+            {"Id": "cloud-run-tail-old-2", "QueueArn": "arn:aws:sqs:old"},
+            {"Id": "someone-else", "QueueArn": "arn:aws:sqs:theirs"},
+        ]
+        missing = Exception("missing")
+        missing.response = {"Error": {"Code": "AWS.SimpleQueueService.NonExistentQueue"}}
+
+        def get_queue_url(QueueName):
+            if QueueName == "gone":
+                raise missing
+            return {"QueueUrl": f"https://sqs/{QueueName}"}
+
+        def get_queue_attributes(QueueUrl, AttributeNames):
+            age = 2 * notifications._STALE_QUEUE_SECONDS if QueueUrl.endswith("old") else 0
+            return {"Attributes": {
+                "QueueArn": "arn:aws:sqs:q", "CreatedTimestamp": str(int(time.time() - age)),
+            }}
+
+        sqs.get_queue_url.side_effect = get_queue_url
+        sqs.get_queue_attributes.side_effect = get_queue_attributes
+        with mock.patch.object(notifications, "_sqs_client", return_value=sqs), \
+                mock.patch.object(notifications, "_s3_client", return_value=s3c):
+            with notifications.watch_prefix("cloud-runs/run-n/") as watcher:
+                self.assertIsNotNone(watcher)
+                ids = [q["Id"] for q in state["config"]["QueueConfigurations"]]
+                self.assertEqual(ids[0], "someone-else")
+                self.assertEqual(len(ids), 2)
+        sqs.delete_queue.assert_any_call(QueueUrl="https://sqs/old")
+
+    def test_tail_log_waits_on_events_instead_of_sleeping(self):
+        from contextlib import contextmanager
+        from cloud import s3
+        watcher = mock.MagicMock()
+        watcher.wait.side_effect = [{"experiment.log"}, {"exit_code"}]
+
+        @contextmanager
+        def fake_watcher(run_id):
+            yield watcher
+
+        client = mock.MagicMock()
+        client.head_object.return_value = {"ETag": "e", "ContentLength": 0}
+        with mock.patch.object(s3, "_log_watcher", fake_watcher), \
+                mock.patch.object(s3, "_get_s3_client", return_value=client), \
+                mock.patch.object(s3, "check_exit_code", side_effect=[None, 0]) as exit_code, \
+                mock.patch.object(s3.time, "sleep") as sleep:
+            s3.tail_log("run-n", follow=True)
+
+        sleep.assert_not_called()
+        self.assertEqual(watcher.wait.call_count, 2)
+        self.assertEqual(exit_code.call_count, 2)
+
+    def test_tail_log_polls_when_no_event_arrives(self):
+        from contextlib import contextmanager
+        from cloud import s3
+        watcher = mock.MagicMock()
+        watcher.wait.return_value = set()
+
+        @contextmanager
+        def fake_watcher(run_id):
+            yield watcher
+
+        client = mock.MagicMock()
+        client.head_object.return_value = {"ETag": "e", "ContentLength": 0}
+        with mock.patch.object(s3, "_log_watcher", fake_watcher), \
+                mock.patch.object(s3, "_get_s3_client", return_value=client), \
+                mock.patch.object(s3, "check_exit_code", side_effect=[None, 0]) as exit_code:
+            s3.tail_log("run-n", follow=True)
+
+        watcher.wait.assert_called_once()
+        self.assertEqual(exit_code.call_count, 2)
+
+    def test_tail_log_falls_back_to_polling_when_wait_fails(self):
+        from contextlib import contextmanager
+        from cloud import s3
+        watcher = mock.MagicMock()
+        watcher.wait.side_effect = Exception("queue deleted")
+
+        @contextmanager
+        def fake_watcher(run_id):
+            yield watcher
+
+        client = mock.MagicMock()
+        client.head_object.return_value = {"ETag": "e", "ContentLength": 0}
+        with mock.patch.object(s3, "_log_watcher", fake_watcher), \
+                mock.patch.object(s3, "_get_s3_client", return_value=client), \
+                mock.patch.object(s3, "check_exit_code", side_effect=[None, None, 0]), \
+                mock.patch.object(s3.log, "warning") as warning, \
+                mock.patch.object(s3.time, "sleep") as sleep:
+            s3.tail_log("run-n", follow=True)
+
+        watcher.wait.assert_called_once()
+        warning.assert_called_once()
+        sleep.assert_called_once_with(10)
+
 
 # ---------------------------------------------------------------------------
 # TestProjectLocalState
@@ -329,11 +998,12 @@ class TestProjectLocalState(unittest.TestCase):
             instance_type="c7a.8xlarge", spec_file="spec.md",
             launched_at="2026-02-18T12:00:00+00:00", max_hours=4.0,
         )
-        state_path = Path(self.project_root) / ".kit" / "cloud-state.json"
-        self.assertTrue(state_path.exists())
-        data = json.loads(state_path.read_text())
-        self.assertIn("run-1", data["active_runs"])
-        self.assertEqual(data["active_runs"]["run-1"]["instance_id"], "i-abc")
+        journal_path = Path(self.project_root) / ".kit" / "cloud-state.jsonl"
+        self.assertTrue(journal_path.exists())
+        events = [json.loads(l) for l in journal_path.read_text().splitlines()]
+        self.assertEqual(events[-1]["op"], "put")
+        self.assertEqual(events[-1]["run_id"], "run-1")
+        self.assertEqual(events[-1]["entry"]["instance_id"], "i-abc")
 
     def test_remove_cleans_entry(self):
         project_state.register_run(
@@ -396,6 +1066,82 @@ class TestProjectLocalState(unittest.TestCase):
         # Should not raise
         project_state.remove_run(self.project_root, "nonexistent")
 
+    def test_update_on_missing_is_noop(self):
+        project_state.update_run(self.project_root, "nonexistent", status="x")
+        self.assertIsNone(project_state.get_run(self.project_root, "nonexistent"))
+
+    def test_torn_journal_line_ignored(self):
+        project_state.register_run(
+            self.project_root, "run-t",
+            instance_id="i-t", backend="aws", instance_type="c7a.8xlarge",
+        )
+        journal = Path(self.project_root) / ".kit" / "cloud-state.jsonl"
+        with open(journal, "a") as f:
+            f.write('{"op": "remove", "run_')
+        self.assertIsNotNone(project_state.get_run(self.project_root, "run-t"))
+
+    def test_gc_stale_removes_finished_and_silent_runs(self):
+        old = (datetime.now(timezone.utc) - timedelta(hours=30)).isoformat()
+        for run_id, launched in [("run-done", None), ("run-silent", old),
+                                 ("run-alive", old), ("run-new", None)]:
+            project_state.register_run(
+                self.project_root, run_id, instance_id=f"i-{run_id}",
+                backend="aws", instance_type="c7a.8xlarge", launched_at=launched,
+            )
+        now = datetime.now(timezone.utc)
+        markers = {"run-done": {"exit_code": now}, "run-alive": {"heartbeat": now}}
+
+        from cloud import s3
+        with mock.patch.object(s3, "list_run_markers",
+                               side_effect=lambda rid: markers.get(rid, {})) as listing:
+            cleaned = project_state.gc_stale(self.project_root)
+
+        self.assertEqual(cleaned, 2)
+        self.assertEqual(listing.call_count, 4)
+        remaining = sorted(r["run_id"] for r in project_state.list_active_runs(self.project_root))
+        self.assertEqual(remaining, ["run-alive", "run-new"])
+
+    def test_journal_compacts_into_snapshot(self):
+        with mock.patch.object(project_state, "_COMPACT_AFTER_BYTES", 1):
+            project_state.register_run(
+                self.project_root, "run-c",
+                instance_id="i-c", backend="aws", instance_type="c7a.8xlarge",
+            )
+        kit = Path(self.project_root) / ".kit"
+        self.assertEqual((kit / "cloud-state.jsonl").stat().st_size, 0)
+        data = json.loads((kit / "cloud-state.json").read_text())
+        self.assertEqual(data["active_runs"]["run-c"]["instance_id"], "i-c")
+
+        project_state.update_run(self.project_root, "run-c", status="running")
+        self.assertEqual(project_state.get_run(self.project_root, "run-c")["status"], "running")
+
+    def test_save_leaves_no_temp_files(self):
+        kit = Path(self.project_root) / ".kit"
+        for fast_path in (True, False):
+            with mock.patch.object(
+                project_state, "_save_tmpfile",
+                wraps=project_state._save_tmpfile if fast_path else (lambda p, b: False),
+            ):
+                project_state._save(self.project_root, {"active_runs": {"r": {"n": fast_path}}})
+            self.assertEqual(sorted(os.listdir(kit)), ["cloud-state.json"])
+            data = json.loads((kit / "cloud-state.json").read_text())
+            self.assertEqual(data["active_runs"]["r"]["n"], fast_path)
+
+    def test_repeated_loads_reuse_parsed_state(self):
+        project_state.register_run(
+            self.project_root, "run-p",
+            instance_id="i-p", backend="aws", instance_type="c7a.8xlarge",
+        )
+        with mock.patch.object(project_state, "_loads", wraps=project_state._loads) as loads:
+            project_state.get_run(self.project_root, "run-p")
+            parsed = loads.call_count
+            project_state.list_active_runs(self.project_root)
+            self.assertEqual(loads.call_count, parsed)
+
+            project_state.update_run(self.project_root, "run-p", status="running")
+            self.assertEqual(project_state.get_run(self.project_root, "run-p")["status"], "running")
+            self.assertGreater(loads.call_count, parsed)
+
 
 # ---------------------------------------------------------------------------
 # TestReaper
@@ -479,5 +1225,217 @@ class TestReaper(unittest.TestCase):
         self.assertEqual(actions, [])
 
 
+# ---------------------------------------------------------------------------
+# TestValidate
+# ---------------------------------------------------------------------------
+
+class TestValidate(unittest.TestCase):
+    """Verify pre-flight script validation."""
+
+    def _script(self, source: str) -> str:
+        fd, path = tempfile.mkstemp(suffix=".py")
+        with os.fdopen(fd, "w") as f:
+            f.write(source)
+        self.addCleanup(os.unlink, path)
+        return path
+
+    def test_syntax_check_memoized_on_contents(self):
+        from cloud import validate
+        script = self._script("x = 1\n")
+        with mock.patch.object(validate, "_parse", wraps=validate._parse) as parse:
+            self.assertEqual(validate.syntax_check(script), (True, "Syntax OK"))
+            self.assertEqual(validate.syntax_check(script), (True, "Syntax OK"))
+            self.assertEqual(parse.call_count, 1)
+            Path(script).write_text("x = (\n")
+            self.assertFalse(validate.syntax_check(script)[0])
+            self.assertEqual(parse.call_count, 2)
+
+    def test_syntax_check_catches_compiler_errors(self):
+        from cloud import validate
+        for source in ("return 5\n", "break\n", "def f():\n    nonlocal x\n"):
+            script = self._script(source)
+            self.assertFalse(validate.syntax_check(script)[0], source)
+            ok, checks = validate.validate_all(script, skip_smoke=True)
+            self.assertFalse(ok, source)
+            self.assertEqual(checks[-1][0], "syntax")
+
+    def test_validate_all_reads_script_once(self):
+        from cloud import validate
+        script = self._script("import os\n")
+        with mock.patch.object(validate, "_read_source", wraps=validate._read_source) as read, \
+                mock.patch.object(validate, "_parse", wraps=validate._parse) as parse:
+            ok, checks = validate.validate_all(script, skip_smoke=True)
+        self.assertTrue(ok)
+        self.assertEqual([c[0] for c in checks], ["syntax", "imports"])
+        read.assert_called_once_with(script)
+        parse.assert_called_once()
+
+    def test_validate_all_disk_cache(self):
+        from cloud import validate
+        script = self._script("import os\n")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache_path = os.path.join(tmp.name, "sub", "validate.json")
+        with mock.patch.object(validate.config, "VALIDATE_CACHE", True), \
+                mock.patch.object(validate.config, "VALIDATE_CACHE_PATH", cache_path), \
+                mock.patch.object(validate, "_DISK_CACHE", None), \
+                mock.patch.object(validate, "_validate_uncached",
+                                  wraps=validate._validate_uncached) as run:
+            first = validate.validate_all(script, skip_smoke=True)
+            self.assertEqual(validate.validate_all(script, skip_smoke=True), first)
+            self.assertEqual(run.call_count, 1)
+            validate._save_disk_cache()
+
+            validate._DISK_CACHE = None  # fresh process: reload from disk
+            self.assertEqual(validate.validate_all(script, skip_smoke=True), first)
+            self.assertEqual(run.call_count, 1)
+
+            Path(script).write_text("import zz_missing_after_edit\n")
+            self.assertFalse(validate.validate_all(script, skip_smoke=True)[0])
+            self.assertFalse(validate.validate_all(script, skip_smoke=True)[0])
+            self.assertEqual(run.call_count, 3)  # failures are not cached
+
+    def test_validate_all_cancels_smoke_test_on_missing_imports(self):
+        from cloud import validate
+        script = self._script("import time\nimport zz_missing_smoke\ntime.sleep(60)\n")
+        start = time.monotonic()
+        with mock.patch.object(validate, "smoke_test", wraps=validate.smoke_test) as smoke:
+            ok, checks = validate.validate_all(script)
+        self.assertLess(time.monotonic() - start, 30)
+        self.assertFalse(ok)
+        self.assertEqual([c[0] for c in checks], ["syntax", "imports"])
+        smoke.assert_called_once()
+        self.assertTrue(smoke.call_args.kwargs["cancel"].is_set())
+
+    def test_validate_all_runs_imports_and_smoke_test(self):
+        from cloud import validate
+        script = self._script("import os\n")
+        ok, checks = validate.validate_all(script)
+        self.assertTrue(ok)
+        self.assertEqual(checks, [
+            ("syntax", True, "Syntax OK"),
+            ("imports", True, "All 1 imports OK"),
+            ("smoke_test", True, "Smoke test passed"),
+        ])
+
+    def test_smoke_test_reports_stderr_tail(self):
+        from cloud import validate
+        script = self._script(
+            "import sys\nfor i in range(5000):\n    print('line', i, file=sys.stderr)\nsys.exit(3)\n")
+        ok, msg = validate._run_smoke(script, timeout=30)
+        self.assertFalse(ok)
+        lines = msg.splitlines()
+        self.assertEqual(lines[0], "Smoke test failed:")
+        self.assertEqual(lines[1:], [f"line {i}" for i in range(4980, 5000)])
+
+    def test_smoke_test_memoized_and_failures_expire(self):
+        from cloud import validate
+        script = self._script("import sys\nsys.exit(1 if '--smoke-test' in sys.argv else 0)\n")
+        with mock.patch.object(validate, "_run_smoke", wraps=validate._run_smoke) as run, \
+                mock.patch.object(validate, "_SMOKE_FAILURE_TTL", 0.0):
+            self.assertFalse(validate.smoke_test(script, timeout=30)[0])
+            self.assertFalse(validate.smoke_test(script, timeout=30)[0])
+            self.assertEqual(run.call_count, 2)  # failure expired immediately
+
+            Path(script).write_text("pass\n")
+            self.assertEqual(validate.smoke_test(script, timeout=30), (True, "Smoke test passed"))
+            self.assertEqual(validate.smoke_test(script, timeout=30), (True, "Smoke test passed"))
+            self.assertEqual(run.call_count, 3)
+
+    def test_validate_all_batch(self):
+        from cloud import validate
+        good = self._script("import os\n")
+        bad = self._script("x = (\n")
+        for scripts in ([good, bad], [good, bad, good, bad]):  # serial, then pooled
+            results = validate.validate_all_batch(scripts, skip_smoke=True)
+            self.assertTrue(results[good][0])
+            self.assertFalse(results[bad][0])
+            self.assertEqual(results[bad][1][0][0], "syntax")
+
+    def test_import_check_ok(self):
+        from cloud import validate
+        ok, msg = validate.import_check(self._script("import os\nimport json.decoder\n"))
+        self.assertTrue(ok)
+        self.assertEqual(msg, "All 2 imports OK")
+
+    def test_import_check_reports_missing_sorted(self):
+        from cloud import validate
+        script = self._script("import zz_missing_b\nimport os\nfrom zz_missing_a import x\n")
+        ok, msg = validate.import_check(script)
+        self.assertFalse(ok)
+        self.assertEqual(msg, "Missing imports: zz_missing_a, zz_missing_b")
+
+    def test_import_check_only_top_level_absolute_imports(self):
+        from cloud import validate
+        script = self._script(
+            "import os.path\n"
+            "from . import sibling\n"
+            "from .pkg import thing\n"
+            "try:\n    import json\nexcept ImportError:\n    pass\n"
+            "def f():\n    import zz_lazy_optional\n"
+            "class C:\n    import zz_class_level\n"
+        )
+        ok, msg = validate.import_check(script)
+        self.assertTrue(ok, msg)
+        self.assertEqual(msg, "All 2 imports OK")
+
+    def test_import_check_in_process_by_default(self):
+        from cloud import validate
+        script = self._script("import os\nimport zz_missing\n")
+        with mock.patch.object(validate.subprocess, "run") as run:
+            ok, msg = validate.import_check(script)
+        run.assert_not_called()
+        self.assertEqual(msg, "Missing imports: zz_missing")
+
+    def test_import_check_isolated_catches_broken_module(self):
+        from cloud import validate
+        with tempfile.TemporaryDirectory() as d:
+            Path(d, "zz_broken.py").write_text("raise RuntimeError('boom')\n")
+            script = self._script("import zz_broken\n")
+            with mock.patch.object(sys, "path", [d, *sys.path]), \
+                    mock.patch.dict(os.environ, {"PYTHONPATH": d}):
+                self.assertTrue(validate.import_check(script)[0])
+                self.assertFalse(validate.import_check(script, isolated=True)[0])
+
+    def test_import_check_isolated_skips_stdlib(self):
+        from cloud import validate
+        script = self._script("import os\nimport sys\nimport json\n")
+        with mock.patch.object(validate.subprocess, "run") as run:
+            ok, msg = validate.import_check(script, isolated=True)
+        run.assert_not_called()
+        self.assertEqual(msg, "All 3 imports OK")
+
+    def test_probe_interpreter_reused_across_checks(self):
+        from cloud import validate
+        with mock.patch.object(validate, "_IMPORT_CACHE_ENV", None):
+            validate.import_check(self._script("import zz_reuse_a\n"), isolated=True)
+            pid = validate._PROBE.proc.pid
+            ok, msg = validate.import_check(self._script("import zz_reuse_b\n"), isolated=True)
+            self.assertEqual(validate._PROBE.proc.pid, pid)
+        self.assertEqual(msg, "Missing imports: zz_reuse_b")
+
+    def test_import_probes_cached_across_calls(self):
+        from cloud import validate
+        script = self._script("import zz_cached_missing\nimport unittest.mock\n")
+        with mock.patch.object(validate, "_IMPORT_CACHE_ENV", None), \
+                mock.patch.object(validate, "_probe_imports_isolated",
+                                  return_value=["zz_cached_missing"]) as probe:
+            first = validate.import_check(script, isolated=True)
+            second = validate.import_check(script, isolated=True)
+        self.assertEqual(first, second)
+        self.assertEqual(first[1], "Missing imports: zz_cached_missing")
+        probe.assert_called_once()
+
+    def test_import_check_isolated_attributes_interpreter_crash(self):
+        from cloud import validate
+        with tempfile.TemporaryDirectory() as d:
+            Path(d, "zz_exits.py").write_text("import os\nos._exit(3)\n")
+            script = self._script("import os\nimport zz_exits\nimport zz_missing\n")
+            with mock.patch.dict(os.environ, {"PYTHONPATH": d}):
+                ok, msg = validate.import_check(script, isolated=True)
+        self.assertFalse(ok)
+        self.assertEqual(msg, "Missing imports: zz_exits, zz_missing")
+
+
 if __name__ == "__main__":
     unittest.main()
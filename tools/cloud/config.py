@@ -90,6 +90,23 @@ ECS_OPTIMIZED_AMI_SSM_PARAM = os.environ.get(
 
 # S3 paths
 S3_RUNS_PREFIX = "cloud-runs"
+S3_CODE_PREFIX = "cloud-code"  # content-addressed code tarballs shared across runs
+# Route S3 traffic through Transfer Acceleration edges (bucket must have it enabled)
+S3_ACCELERATE = os.environ.get("CLOUD_RUN_S3_ACCELERATE", "").strip().lower() in ("1", "true")
+# Desired S3 transfer throughput; sizes transfer concurrency when set (0 = size-based)
+S3_TARGET_THROUGHPUT_GBPS = float(os.environ.get("CLOUD_RUN_TARGET_THROUGHPUT_GBPS", "0") or 0)
+# Write/read S3 markers with the aws CLI instead of the pooled boto3 client
+S3_USE_CLI = os.environ.get("CLOUD_RUN_S3_USE_CLI", "").strip().lower() in ("1", "true")
+# Follow logs via S3 event notifications (temporary SQS queue) instead of polling
+S3_NOTIFY = os.environ.get("CLOUD_RUN_S3_NOTIFY", "").strip().lower() in ("1", "true")
+
+# Reuse passing validate_all results across processes while the script's
+# size and mtime are unchanged (opt-in: import changes don't touch mtimes)
+VALIDATE_CACHE = os.environ.get("CLOUD_RUN_VALIDATE_CACHE", "").strip().lower() in ("1", "true")
+VALIDATE_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "orchestration-kit", "validate.json",
+)
 
 # State directory for detached runs
 STATE_DIR = "~/.orchestration-kit-cloud/runs"
@@ -0,0 +1,207 @@
+"""S3 event notifications — push-driven wakeups for objects under a run prefix.
+
+watch_prefix() creates a temporary SQS queue, adds one queue configuration
+to the bucket's notification config (alongside any existing ones), and
+yields a watcher whose wait() long-polls the queue. The configuration and
+queue are removed on exit. Used by tail_log(follow=True) when
+CLOUD_RUN_S3_NOTIFY is set. The bucket config is shared, so writes are
+verified by re-reading, and a quiet queue is no substitute for polling:
+callers should re-check whenever wait() returns nothing.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import unquote_plus
+
+from .config import S3_BUCKET, AWS_REGION
+
+log = logging.getLogger(__name__)
+
+
+# SQS long-poll ceiling
+MAX_WAIT_SECONDS = 20
+
+# Queue configurations this module adds are named with this prefix
+_ID_PREFIX = "cloud-run-tail-"
+# A tail session lasts at most 30 min; older queues belong to dead processes
+_STALE_QUEUE_SECONDS = 3600
+# Attempts to get our entry into the shared bucket config under contention
+_PUT_ATTEMPTS = 3
+
+
+def _sqs_client():
+    """Return a boto3 SQS client. Exists as a seam for mocking."""
+    import boto3
+    return boto3.client("sqs", region_name=AWS_REGION)
+
+
+def _s3_client():
+    from .s3 import _get_s3_client
+    return _get_s3_client()
+
+
+class PrefixWatcher:
+    """Receives ObjectCreated events for keys under one prefix."""
+
+    def __init__(self, sqs, queue_url: str, prefix: str):
+        self._sqs = sqs
+        self._queue_url = queue_url
+        self._prefix = prefix
+
+    def wait(self, timeout: int = MAX_WAIT_SECONDS) -> set[str]:
+        """Block up to timeout seconds; return names (relative to the prefix) written since."""
+        resp = self._sqs.receive_message(
+            QueueUrl=self._queue_url,
+            MaxNumberOfMessages=10,
+            WaitTimeSeconds=max(0, min(MAX_WAIT_SECONDS, int(timeout))),
+        )
+        messages = resp.get("Messages", [])
+        if not messages:
+            return set()
+        self._sqs.delete_message_batch(
+            QueueUrl=self._queue_url,
+            Entries=[
+                {"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]}
+                for i, m in enumerate(messages)
+            ],
+        )
+        names = set()
+        for m in messages:
+            try:
+                records = json.loads(m["Body"]).get("Records", [])
+            except (ValueError, AttributeError):
+                continue
+            for rec in records:  # s3:TestEvent messages carry no Records
+                key = unquote_plus(rec.get("s3", {}).get("object", {}).get("key", ""))
+                if key.startswith(self._prefix):
+                    names.add(key[len(self._prefix):])
+        return names
+
+
+def _bucket_notifications(s3) -> dict:
+    config = s3.get_bucket_notification_configuration(Bucket=S3_BUCKET)
+    config.pop("ResponseMetadata", None)
+    return config
+
+
+def _queue_missing(e: Exception) -> bool:
+    code = getattr(e, "response", {}).get("Error", {}).get("Code", "")
+    return "NonExistentQueue" in code or "QueueDoesNotExist" in code
+
+
+def _prune_orphans(sqs, config: dict) -> None:
+    """Drop tail entries left by killed processes, deleting their queues."""
+    kept = []
+    for q in config.get("QueueConfigurations", []):
+        if q.get("Id", "").startswith(_ID_PREFIX):
+            name = q.get("QueueArn", "").rsplit(":", 1)[-1]
+            try:
+                url = sqs.get_queue_url(QueueName=name)["QueueUrl"]
+                created = int(sqs.get_queue_attributes(
+                    QueueUrl=url, AttributeNames=["CreatedTimestamp"],
+                )["Attributes"]["CreatedTimestamp"])
+                if time.time() - created > _STALE_QUEUE_SECONDS:
+                    sqs.delete_queue(QueueUrl=url)
+                    continue
+            except Exception as e:
+                if _queue_missing(e):
+                    continue
+        kept.append(q)
+    config["QueueConfigurations"] = kept
+
+
+def _put_queue_config(s3, sqs, entry: dict) -> None:
+    """Add entry to the bucket's notification config and confirm it stuck.
+
+    The config is shared and S3 has no conditional put, so a concurrent
+    session can overwrite our write; re-read after each put and retry.
+    """
+    for _ in range(_PUT_ATTEMPTS):
+        config = _bucket_notifications(s3)
+        _prune_orphans(sqs, config)
+        config["QueueConfigurations"] = [
+            q for q in config["QueueConfigurations"] if q.get("Id") != entry["Id"]
+        ] + [entry]
+        s3.put_bucket_notification_configuration(
+            Bucket=S3_BUCKET, NotificationConfiguration=config,
+        )
+        current = _bucket_notifications(s3).get("QueueConfigurations", [])
+        if any(q.get("Id") == entry["Id"] for q in current):
+            return
+    raise RuntimeError("bucket notification config kept being overwritten")
+
+
+def _remove_queue_config(s3, config_id: str) -> None:
+    # Re-read so configurations added by others since setup are kept
+    config = _bucket_notifications(s3)
+    config["QueueConfigurations"] = [
+        q for q in config.get("QueueConfigurations", []) if q.get("Id") != config_id
+    ]
+    s3.put_bucket_notification_configuration(
+        Bucket=S3_BUCKET, NotificationConfiguration=config,
+    )
+
+
+@contextmanager
+def watch_prefix(prefix: str):
+    """Yield a PrefixWatcher for S3 writes under prefix, or None if setup fails.
+
+    Setup fails soft (e.g. missing SQS permissions, or an existing bucket
+    notification whose filter overlaps this one); callers fall back to polling.
+    Entries and queues left behind by killed sessions are pruned on setup.
+    """
+    name = _ID_PREFIX + re.sub(r"[^A-Za-z0-9_-]", "-", prefix.rstrip("/").split("/")[-1])
+    name = f"{name[:70]}-{uuid.uuid4().hex[:8]}"
+    sqs = s3 = None
+    queue_url: Optional[str] = None
+    configured = False
+    try:
+        sqs, s3 = _sqs_client(), _s3_client()
+        queue_url = sqs.create_queue(
+            QueueName=name, Attributes={"MessageRetentionPeriod": "300"},
+        )["QueueUrl"]
+        queue_arn = sqs.get_queue_attributes(
+            QueueUrl=queue_url, AttributeNames=["QueueArn"],
+        )["Attributes"]["QueueArn"]
+        sqs.set_queue_attributes(QueueUrl=queue_url, Attributes={"Policy": json.dumps({
+            "Version": "2012-10-17",
+            "Statement": [{
+                "Effect": "Allow",
+                "Principal": {"Service": "s3.amazonaws.com"},
+                "Action": "sqs:SendMessage",
+                "Resource": queue_arn,
+                "Condition": {"ArnEquals": {"aws:SourceArn": f"arn:aws:s3:::{S3_BUCKET}"}},
+            }],
+        })})
+        configured = True  # from here on, teardown removes our entry
+        _put_queue_config(s3, sqs, {
+            "Id": name,
+            "QueueArn": queue_arn,
+            "Events": ["s3:ObjectCreated:*"],
+            "Filter": {"Key": {"FilterRules": [{"Name": "prefix", "Value": prefix}]}},
+        })
+        watcher: Optional[PrefixWatcher] = PrefixWatcher(sqs, queue_url, prefix)
+    except Exception as e:
+        log.warning("S3 notifications unavailable (%s); falling back to polling", e)
+        watcher = None
+
+    try:
+        yield watcher
+    finally:
+        if configured:
+            try:
+                _remove_queue_config(s3, name)
+            except Exception as e:
+                log.warning("Failed to remove bucket notification %s: %s", name, e)
+        if queue_url is not None:
+            try:
+                sqs.delete_queue(QueueUrl=queue_url)
+            except Exception as e:
+                log.warning("Failed to delete SQS queue %s: %s", queue_url, e)
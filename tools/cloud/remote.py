@@ -2,7 +2,9 @@
 
 from __future__ import annotations
 
+import functools
 import json
+import logging
 import os
 import time
 import uuid
@@ -23,6 +25,8 @@ from .config import (
 from . import s3 as s3_helper
 from . import state as project_state
 
+log = logging.getLogger(__name__)
+
 
 class DuplicateSpecError(RuntimeError):
     """Raised when an instance is already running for the same spec file."""
@@ -40,17 +44,50 @@ def _generate_run_id() -> str:
     return f"cloud-{ts}-{short}"
 
 
+# O_DIRECTORY fd for the state dir, opened once per process so per-run state
+# files are opened relative to it instead of re-resolving the full path.
+_STATE_FD: Optional[int] = None
+_USE_STATE_DIR_FD = hasattr(os, "O_DIRECTORY") and os.open in os.supports_dir_fd
+
+
+def _state_dir_fd() -> Optional[int]:
+    """Return the cached state-dir fd, or None where dir_fd is unsupported."""
+    global _STATE_FD
+    if _STATE_FD is None and _USE_STATE_DIR_FD:
+        _STATE_FD = os.open(str(_state_dir()), os.O_RDONLY | os.O_DIRECTORY)
+    return _STATE_FD
+
+
+def _open_state_file(name: str, mode: str):
+    """Open a file in the state dir, relative to the cached dir fd when available."""
+    global _STATE_FD
+    dir_fd = _state_dir_fd()
+    if dir_fd is None:
+        return open(_state_dir() / name, mode)
+    try:
+        return open(name, mode, opener=lambda p, flags: os.open(p, flags, 0o644, dir_fd=dir_fd))
+    except FileNotFoundError:
+        # The dir may have been removed or replaced since the fd was opened;
+        # reopen it through _state_dir() (which recreates it) and retry once
+        os.close(dir_fd)
+        _STATE_FD = None
+        dir_fd = _state_dir_fd()
+        return open(name, mode, opener=lambda p, flags: os.open(p, flags, 0o644, dir_fd=dir_fd))
+
+
 def _save_state(run_id: str, state: dict) -> Path:
-    path = _state_dir() / f"{run_id}.json"
-    path.write_text(json.dumps(state, indent=2))
-    return path
+    name = f"{run_id}.json"
+    with _open_state_file(name, "w") as f:
+        f.write(json.dumps(state, indent=2))
+    return Path(os.path.expanduser(STATE_DIR)) / name
 
 
 def _load_state(run_id: str) -> dict:
-    path = _state_dir() / f"{run_id}.json"
-    if not path.exists():
-        raise FileNotFoundError(f"No state found for run {run_id}")
-    return json.loads(path.read_text())
+    try:
+        with _open_state_file(f"{run_id}.json", "r") as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No state found for run {run_id}") from None
 
 
 def _update_state(run_id: str, **updates) -> dict:
@@ -227,30 +264,47 @@ def run(
         raise
 
 
-def _get_backend_for_run(state: dict):
-    """Instantiate the appropriate backend for a run based on stored state."""
-    backend_name = state.get("backend", "aws")
+# Backend instances keyed by backend name, shared across runs in this process
+_BACKENDS: dict[str, ComputeBackend] = {}
+
+
+@functools.lru_cache(maxsize=4)
+def _get_backend_cls(backend_name: str) -> type[ComputeBackend]:
+    """Import and return the backend class for a backend name."""
     if backend_name == "aws":
         from .backends.aws import AWSBackend
-        return AWSBackend()
+        return AWSBackend
     elif backend_name == "runpod":
         from .backends.runpod import RunPodBackend
-        return RunPodBackend()
+        return RunPodBackend
     raise ValueError(f"Unknown backend: {backend_name}")
 
 
+def _get_backend_for_run(state: dict) -> ComputeBackend:
+    """Return the (cached) backend for a run based on stored state."""
+    backend_name = state.get("backend", "aws")
+    backend = _BACKENDS.get(backend_name)
+    if backend is None:
+        backend = _BACKENDS[backend_name] = _get_backend_cls(backend_name)()
+    return backend
+
+
 def poll_status(run_id: str) -> dict:
     """Check the status of a detached run by polling S3 for exit_code.
 
     Enhanced: when no exit_code is found, checks EC2 instance state and
     includes heartbeat information.
     """
-    state = _load_state(run_id)
+    return _poll_loaded_state(run_id, _load_state(run_id))
+
 
+def _poll_loaded_state(run_id: str, state: dict) -> dict:
+    """Body of poll_status for a run whose state is already loaded."""
     if state["status"] in ("completed", "failed", "error"):
         return state
 
-    exit_code = s3_helper.check_exit_code(run_id)
+    markers = s3_helper.describe_markers(run_id)
+    exit_code = markers["exit_code"]
     if exit_code is not None:
         new_status = "completed" if exit_code == 0 else "failed"
         state = _update_state(
@@ -280,20 +334,27 @@ def poll_status(run_id: str) -> dict:
     except Exception:
         pass
 
-    # Check heartbeat
-    try:
-        heartbeat = s3_helper.check_heartbeat(run_id)
-        if heartbeat:
-            result["last_heartbeat"] = heartbeat["timestamp"]
-            result["heartbeat_age_seconds"] = heartbeat["age_seconds"]
-            if heartbeat["age_seconds"] > 600:
-                result["warning"] = "heartbeat_stale"
-    except Exception:
-        pass
+    # Heartbeat (from the same marker listing)
+    heartbeat = markers["heartbeat"]
+    if heartbeat:
+        result["last_heartbeat"] = heartbeat["timestamp"]
+        age_seconds = int(time.time()) - heartbeat["ts_epoch"]
+        result["heartbeat_age_seconds"] = age_seconds
+        if age_seconds > 600:
+            result["warning"] = "heartbeat_stale"
 
     return result
 
 
+def poll_statuses(run_ids: list[str]) -> list[dict]:
+    """Poll several detached runs, in the order given.
+
+    Backend clients are cached per process, so each is created at most once
+    for the whole batch.
+    """
+    return [_poll_loaded_state(r, _load_state(r)) for r in run_ids]
+
+
 def gc_stale_runs(backend) -> int:
     """Garbage-collect stale runs: check EC2 instance state for running entries.
 
@@ -394,10 +455,11 @@ def _poll_and_retrieve(
 ) -> dict:
     """Poll S3 for exit_code, then retrieve results and terminate."""
     print(f"[{run_id}] Polling for completion (every {POLL_INTERVAL_SECONDS}s)...")
-    start = time.monotonic()
+    start_ns = time.monotonic_ns()
+    inst_status = "unknown"
 
     while True:
-        exit_code = s3_helper.check_exit_code(run_id)
+        exit_code = s3_helper.describe_markers(run_id)["exit_code"]
         if exit_code is not None:
             break
 
@@ -407,28 +469,27 @@ def _poll_and_retrieve(
             if inst_status in ("terminated", "stopped", "shutting-down"):
                 # Instance gone but no exit code — check one more time
                 time.sleep(5)
-                exit_code = s3_helper.check_exit_code(run_id)
+                exit_code = s3_helper.describe_markers(run_id)["exit_code"]
                 if exit_code is None:
                     exit_code = 1  # Assume failure
                 break
         except Exception:
             pass
 
-        elapsed = time.monotonic() - start
-        hours = elapsed / 3600
-        print(f"  ... {elapsed/60:.0f}m elapsed, instance: {inst_status if 'inst_status' in dir() else 'unknown'}")
+        elapsed_s = (time.monotonic_ns() - start_ns) // 1_000_000_000
+        log.info("  ... %dm elapsed, instance: %s", elapsed_s // 60, inst_status)
         time.sleep(POLL_INTERVAL_SECONDS)
 
-    elapsed = time.monotonic() - start
+    elapsed_s = (time.monotonic_ns() - start_ns) // 1_000_000_000
     status = "completed" if exit_code == 0 else "failed"
-    print(f"[{run_id}] Finished in {elapsed/60:.1f}m with exit code {exit_code}")
+    print(f"[{run_id}] Finished in {elapsed_s / 60:.1f}m with exit code {exit_code}")
 
     _update_state(
         run_id,
         exit_code=exit_code,
         status=status,
         finished_at=datetime.now(timezone.utc).isoformat(),
-        elapsed_seconds=round(elapsed),
+        elapsed_seconds=elapsed_s,
     )
 
     # Retrieve results
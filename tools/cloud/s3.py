@@ -2,27 +2,79 @@
 
 from __future__ import annotations
 
+import collections
+import functools
+import hashlib
+import logging
+import math
 import os
+import re
+import shutil
 import subprocess
 import tarfile
-import tempfile
+import threading
 import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Optional
 
-from .config import S3_BUCKET, S3_RUNS_PREFIX, AWS_REGION
+try:
+    import fcntl
+except ImportError:  # Windows: default pipe size
+    fcntl = None
+
+from .config import (
+    S3_BUCKET, S3_RUNS_PREFIX, S3_CODE_PREFIX, S3_ACCELERATE, S3_TARGET_THROUGHPUT_GBPS,
+    S3_USE_CLI, S3_NOTIFY, AWS_REGION,
+)
+
+log = logging.getLogger(__name__)
+
+
+# Upper bound on queued transfers in _transfer_many
+_MAX_IN_FLIGHT = 500
+
+# Multipart sizing: S3's minimum and maximum part sizes, and the part count
+# we aim for per object (well under the 10,000-part cap)
+_MIN_PART_SIZE = 5 * 1024 * 1024
+_MAX_PART_SIZE = 5 * 1024 ** 3
+_TARGET_PARTS = 500
+# AWS performance guidance: one concurrent request per ~85 MB/s of throughput
+_MB_PER_SECOND_PER_CONNECTION = 85
+
+# Code trees at least this large (uncompressed) are compressed for upload
+_COMPRESS_ABOVE_BYTES = 100 * 1024 * 1024
+
+# Pipe capacity for the tar -> upload stream (Linux default is 64 KiB)
+_PIPE_SIZE = 1024 * 1024
+
+# Process-wide boto3 S3 client, created on first use (see _get_s3_client)
+_S3_CLIENT = None
+_S3_CLIENT_LOCK = threading.Lock()
+
+# Connection pool for the shared client; sized for the widest fan-out
+# (gc_stale checks up to 32 runs at once) so keep-alive connections are
+# reused instead of discarded and re-handshaked.
+_S3_MAX_POOL_CONNECTIONS = 64
 
 
 def _s3_prefix(run_id: str) -> str:
     return f"s3://{S3_BUCKET}/{S3_RUNS_PREFIX}/{run_id}"
 
 
+def _s3_key(run_id: str, name: str) -> str:
+    return f"{S3_RUNS_PREFIX}/{run_id}/{name}"
+
+
 def upload_code(project_root: str, run_id: str, *, exclude_patterns: Optional[list[str]] = None) -> str:
     """Tar project code (respecting .gitignore) and upload to S3.
 
-    Returns the S3 URI of the uploaded archive.
+    Returns the S3 URI of the uploaded archive. The run's copy is always
+    named code.tar; its codec follows _archive_codec and the bootstrap
+    script detects it when extracting.
 
     .. deprecated::
         Use ECR images instead. Set CLOUD_RUN_ECR_REPO_URI to enable
@@ -34,25 +86,115 @@ def upload_code(project_root: str, run_id: str, *, exclude_patterns: Optional[li
         DeprecationWarning,
         stacklevel=2,
     )
-    s3_uri = f"{_s3_prefix(run_id)}/code.tar.gz"
+    key = _s3_key(run_id, "code.tar")
     project = Path(project_root)
 
-    with tempfile.NamedTemporaryFile(suffix=".tar.gz", delete=False) as tmp:
-        tmp_path = tmp.name
+    # Use git ls-files to respect .gitignore, fall back to full dir
+    tracked_files = _git_tracked_files(project)
+    if tracked_files is None:
+        _stream_code_archive(project, tracked_files, exclude_patterns or [], key)
+        return f"s3://{S3_BUCKET}/{key}"
+
+    # Content-addressed: an unchanged tree reuses the tarball uploaded by an
+    # earlier run, and the run gets a server-side copy of it.
+    digest, total_bytes = _code_fingerprint(project, tracked_files)
+    suffix = _archive_codec(total_bytes)
+    code_key = f"{S3_CODE_PREFIX}/{digest}{suffix}"
+    if not _object_exists(code_key):
+        _stream_code_archive(
+            project, tracked_files, [], code_key, size_hint=total_bytes, suffix=suffix,
+        )
+    _get_s3_client().copy_object(
+        Bucket=S3_BUCKET, Key=key, CopySource={"Bucket": S3_BUCKET, "Key": code_key},
+    )
+    write_marker(run_id, "code_ref", digest)
+
+    return f"s3://{S3_BUCKET}/{key}"
+
 
+def _code_fingerprint(project: Path, files: list[str]) -> tuple[str, int]:
+    """Hash tracked file names, sizes and mtimes into a short content key.
+
+    Also returns the total uncompressed size, used to size upload parts.
+    """
+    h = hashlib.sha256()
+    total = 0
+    for f in sorted(files):
+        try:
+            st = (project / f).stat()
+        except OSError:
+            continue
+        h.update(f.encode())
+        h.update(b"\0%d\0%d\n" % (st.st_size, st.st_mtime_ns))
+        total += st.st_size
+    return h.hexdigest()[:16], total
+
+
+def _stream_code_archive(project: Path, tracked_files: Optional[list[str]],
+                         exclude: list[str], key: str, *,
+                         size_hint: Optional[int] = None,
+                         suffix: str = ".tar.gz") -> None:
+    """Tar the project into an S3 multipart upload without staging on disk."""
+    # A producer thread writes the tar into a pipe while the multipart
+    # upload reads the other end.
+    read_fd, write_fd = os.pipe()
+    # A wider pipe lets the compressor run further ahead of the uploader,
+    # cutting the context switches per part from ~80 to ~5.
+    if fcntl is not None and hasattr(fcntl, "F_SETPIPE_SZ"):
+        try:
+            fcntl.fcntl(write_fd, fcntl.F_SETPIPE_SZ, _PIPE_SIZE)
+        except OSError:
+            pass  # above /proc/sys/fs/pipe-max-size; keep the default
+    errors: list[BaseException] = []
+
+    def _produce() -> None:
+        try:
+            with os.fdopen(write_fd, "wb") as sink:
+                if tracked_files is not None:
+                    _create_tar_from_list(project, tracked_files, sink, suffix)
+                else:
+                    _create_tar_from_dir(project, sink, exclude)
+        except BaseException as e:
+            errors.append(e)
+
+    producer = threading.Thread(target=_produce, name="upload-code-tar", daemon=True)
+    producer.start()
     try:
-        # Use git ls-files to respect .gitignore, fall back to full dir
-        tracked_files = _git_tracked_files(project)
-        if tracked_files is not None:
-            _create_tar_from_list(project, tracked_files, tmp_path)
-        else:
-            _create_tar_from_dir(project, tmp_path, exclude_patterns or [])
-
-        _aws_s3_cp(tmp_path, s3_uri)
+        with os.fdopen(read_fd, "rb") as source:
+            _upload_fileobj(_ProducerReader(source, producer, errors), key, size_hint=size_hint)
     finally:
-        os.unlink(tmp_path)
+        # Closing the read end unblocks the producer if the upload failed
+        producer.join()
+    if errors:
+        raise errors[0]
 
-    return s3_uri
+
+class _ProducerReader:
+    """Read end of a producer pipe that fails at EOF if the producer failed.
+
+    A failed producer just closes its end, which looks like a clean EOF.
+    Raising from read() instead makes the upload abort rather than store a
+    truncated archive (at a content-addressed key it would be reused).
+    """
+
+    def __init__(self, source, producer: threading.Thread, errors: list[BaseException]):
+        self._source = source
+        self._producer = producer
+        self._errors = errors
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._source.read(size)
+        if not data and size != 0:
+            self._producer.join()
+            if self._errors:
+                raise RuntimeError(f"Creating code archive failed: {self._errors[0]}")
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
 
 
 def upload_dirs(local_dirs: list[str], run_id: str) -> list[str]:
@@ -67,7 +209,7 @@ def upload_dirs(local_dirs: list[str], run_id: str) -> list[str]:
             raise FileNotFoundError(f"Data directory not found: {local_dir}")
         name = p.name
         s3_uri = f"{_s3_prefix(run_id)}/data/{name}/"
-        _aws_s3_sync(str(p), s3_uri)
+        _upload_dir(str(p), s3_uri)
         uris.append(s3_uri)
     return uris
 
@@ -84,73 +226,158 @@ def check_exit_code(run_id: str) -> Optional[int]:
 
     Returns the exit code (int) if found, None if not yet written.
     """
-    s3_uri = f"{_s3_prefix(run_id)}/exit_code"
     try:
-        result = subprocess.run(
-            ["aws", "s3", "cp", s3_uri, "-", "--region", AWS_REGION],
-            capture_output=True, text=True, timeout=15,
-        )
-        if result.returncode == 0:
-            return int(result.stdout.strip())
-    except (subprocess.TimeoutExpired, ValueError):
+        body = _read_object(_s3_key(run_id, "exit_code"))
+        if body is not None:
+            return int(body.strip())
+    except Exception:
         pass
     return None
 
 
 def write_marker(run_id: str, key: str, content: str) -> None:
     """Write a small marker file to S3 (e.g., exit_code, started)."""
-    s3_uri = f"{_s3_prefix(run_id)}/{key}"
-    subprocess.run(
-        ["aws", "s3", "cp", "-", s3_uri, "--region", AWS_REGION],
-        input=content, capture_output=True, text=True, timeout=15,
+    if S3_USE_CLI:
+        subprocess.run(
+            ["aws", "s3", "cp", "-", f"{_s3_prefix(run_id)}/{key}", "--region", AWS_REGION],
+            input=content, capture_output=True, text=True, timeout=15,
+        )
+        return
+    _get_s3_client().put_object(
+        Bucket=S3_BUCKET, Key=_s3_key(run_id, key), Body=content.encode(),
     )
 
 
 def check_heartbeat(run_id: str) -> Optional[dict]:
     """Check if a heartbeat file exists in S3 for the given run.
 
-    Returns {"timestamp": "<ISO-8601>", "age_seconds": <int>} if found,
-    None if no heartbeat exists.
+    Returns {"timestamp": "<ISO-8601>", "ts_epoch": <int>, "age_seconds": <int>}
+    if found, None if no heartbeat exists.
     """
-    s3_uri = f"{_s3_prefix(run_id)}/heartbeat"
     try:
-        result = subprocess.run(
-            ["aws", "s3", "cp", s3_uri, "-", "--region", AWS_REGION],
-            capture_output=True, text=True, timeout=15,
-        )
-        if result.returncode == 0 and result.stdout.strip():
-            ts_str = result.stdout.strip()
-            ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
-            now = datetime.now(timezone.utc)
-            age = int((now - ts).total_seconds())
-            return {"timestamp": ts_str, "age_seconds": age}
+        body = _read_object(_s3_key(run_id, "heartbeat"))
+        if body and body.strip():
+            return _heartbeat_info(_heartbeat_epoch(body.strip()))
     except Exception:
         pass
     return None
 
 
+def _heartbeat_epoch(body: str) -> int:
+    """Parse a heartbeat body: epoch seconds, or ISO-8601 from older bootstraps."""
+    if body.isdigit():
+        return int(body)
+    return int(datetime.fromisoformat(body.replace("Z", "+00:00")).timestamp())
+
+
+def _heartbeat_info(ts_epoch: int) -> dict:
+    """Build the heartbeat dict returned by check_heartbeat/describe_markers."""
+    return {
+        "timestamp": datetime.fromtimestamp(ts_epoch, timezone.utc).isoformat(),
+        "ts_epoch": ts_epoch,
+        "age_seconds": int(time.time()) - ts_epoch,
+    }
+
+
+def list_run_markers(run_id: str) -> dict[str, datetime]:
+    """List the run's top-level objects in one call as {name: LastModified}.
+
+    Subdirectories (results/, data/) are collapsed by the delimiter, so the
+    listing only holds marker-sized files such as exit_code and heartbeat.
+    """
+    resp = _get_s3_client().list_objects_v2(
+        Bucket=S3_BUCKET, Prefix=_s3_key(run_id, ""), Delimiter="/", MaxKeys=100,
+    )
+    return {
+        obj["Key"].rsplit("/", 1)[-1]: obj["LastModified"]
+        for obj in resp.get("Contents", [])
+    }
+
+
+def describe_markers(run_id: str) -> dict:
+    """Report the run's exit_code and heartbeat markers from one S3 listing.
+
+    Returns {"exit_code": <int or None>, "heartbeat": <dict or None>}, where
+    heartbeat has the same shape as check_heartbeat() but is derived from
+    the object's LastModified, so no heartbeat download is needed. The
+    exit_code marker is only downloaded when the listing shows it exists.
+    If the listing fails, both markers are read directly instead.
+    """
+    try:
+        markers = list_run_markers(run_id)
+    except Exception:
+        # e.g. no s3:ListBucket permission; don't report a finished run as running
+        return {"exit_code": check_exit_code(run_id), "heartbeat": check_heartbeat(run_id)}
+
+    exit_code = check_exit_code(run_id) if "exit_code" in markers else None
+
+    heartbeat = None
+    if "heartbeat" in markers:
+        heartbeat = _heartbeat_info(int(markers["heartbeat"].timestamp()))
+
+    return {"exit_code": exit_code, "heartbeat": heartbeat}
+
+
 def _get_s3_client():
-    """Return a boto3 S3 client. Exists as a seam for mocking."""
-    import boto3
-    return boto3.client("s3", region_name=AWS_REGION)
+    """Return the shared boto3 S3 client. Exists as a seam for mocking."""
+    global _S3_CLIENT
+    if _S3_CLIENT is None:
+        with _S3_CLIENT_LOCK:
+            if _S3_CLIENT is None:
+                import boto3
+                from botocore.config import Config
+                config = Config(
+                    max_pool_connections=_S3_MAX_POOL_CONNECTIONS, tcp_keepalive=True,
+                )
+                client = boto3.Session().client("s3", region_name=AWS_REGION, config=config)
+                if S3_ACCELERATE and _bucket_accelerated(client):
+                    client = boto3.Session().client(
+                        "s3", region_name=AWS_REGION,
+                        config=config.merge(Config(s3={"use_accelerate_endpoint": True})),
+                    )
+                _S3_CLIENT = client
+    return _S3_CLIENT
+
+
+_ACCELERATED: Optional[bool] = None
+
+
+def _bucket_accelerated(client=None) -> bool:
+    """Whether S3_BUCKET has Transfer Acceleration enabled (checked once)."""
+    global _ACCELERATED
+    if _ACCELERATED is None:
+        client = client or _get_s3_client()
+        if _ACCELERATED is not None:  # set while _get_s3_client() built the client
+            return _ACCELERATED
+        try:
+            status = client.get_bucket_accelerate_configuration(Bucket=S3_BUCKET).get("Status")
+        except Exception:
+            status = None
+        _ACCELERATED = status == "Enabled"
+        if not _ACCELERATED:
+            warnings.warn(
+                f"CLOUD_RUN_S3_ACCELERATE is set but Transfer Acceleration is not enabled "
+                f"on s3://{S3_BUCKET}; using the regional endpoint",
+                stacklevel=2,
+            )
+    return _ACCELERATED
 
 
 def tail_log(run_id: str, lines: int = 50, follow: bool = False) -> str:
     """Download experiment log from S3 and return the last N lines.
 
     If follow=True, enters a polling loop (10s interval) printing new lines
-    until exit_code appears or 30 min safety timeout.
+    until exit_code appears or 30 min safety timeout. With S3_NOTIFY set,
+    the loop instead blocks on S3 event notifications for the run prefix
+    and only fetches after a write (re-checking every _RESYNC_SECONDS).
     """
-    s3_uri = f"{_s3_prefix(run_id)}/experiment.log"
+    key = _s3_key(run_id, "experiment.log")
 
     def _fetch_log() -> str:
-        result = subprocess.run(
-            ["aws", "s3", "cp", s3_uri, "-", "--region", AWS_REGION],
-            capture_output=True, text=True, timeout=60,
-        )
-        if result.returncode == 0:
-            return result.stdout
-        return ""
+        try:
+            return _read_object(key) or ""
+        except Exception:
+            return ""
 
     if not follow:
         content = _fetch_log()
@@ -160,34 +387,94 @@ def tail_log(run_id: str, lines: int = 50, follow: bool = False) -> str:
         tail_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
         return "\n".join(tail_lines)
 
-    # Follow mode
-    seen_lines = 0
+    # Follow mode: HeadObject each poll and fetch only the bytes appended
+    # since the last one with a ranged GetObject.
+    client = _get_s3_client()
+    tail: collections.deque[str] = collections.deque(maxlen=lines)
+    offset = 0
+    etag = None
+    partial = b""
+
+    def _print_new_lines() -> None:
+        nonlocal offset, etag, partial
+        try:
+            head = client.head_object(Bucket=S3_BUCKET, Key=key)
+            if head["ETag"] == etag:
+                return
+            start = offset
+            if head["ContentLength"] < start:
+                start = 0  # log was replaced by a shorter one; start over
+            if head["ContentLength"] > start:
+                resp = client.get_object(Bucket=S3_BUCKET, Key=key, Range=f"bytes={start}-")
+                chunk = resp["Body"].read()
+            else:
+                chunk = b""
+        except Exception:
+            return  # nothing recorded: the next pass retries the same range
+        # Advance only once the bytes are in hand
+        etag = head["ETag"]
+        if start < offset:
+            partial = b""
+        offset = start + len(chunk)
+        *complete, partial = (partial + chunk).split(b"\n")
+        for raw in complete:
+            line = raw.decode(errors="replace")
+            print(line)
+            tail.append(line)
+
     start = time.monotonic()
     timeout = 30 * 60  # 30 minutes
-
-    while time.monotonic() - start < timeout:
-        content = _fetch_log()
-        if content:
-            all_lines = content.splitlines()
-            if len(all_lines) > seen_lines:
-                new_lines = all_lines[seen_lines:]
-                for line in new_lines:
-                    print(line)
-                seen_lines = len(all_lines)
-
-        # Check if run completed
-        if check_exit_code(run_id) is not None:
-            break
-
-        time.sleep(10)
-
-    # Return final tail
-    content = _fetch_log()
-    if not content:
-        return ""
-    all_lines = content.splitlines()
-    tail_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
-    return "\n".join(tail_lines)
+    everything = {"experiment.log", "exit_code"}
+
+    with _log_watcher(run_id) as watcher:
+        changed = everything
+        last_sync = start
+        while time.monotonic() - start < timeout:
+            if "experiment.log" in changed:
+                _print_new_lines()
+
+            # Check if run completed
+            if "exit_code" in changed and check_exit_code(run_id) is not None:
+                break
+
+            if watcher is None:
+                time.sleep(10)
+                continue
+            try:
+                changed = watcher.wait()
+            except Exception as e:  # throttling, queue deleted, expired credentials
+                log.warning("S3 notifications failed (%s); falling back to polling", e)
+                watcher, changed = None, everything
+                continue
+            # A quiet queue may mean our bucket entry was lost to a concurrent
+            # config write, so poll as usual; also re-check periodically in
+            # case a single notification was dropped
+            if not changed or time.monotonic() - last_sync >= _RESYNC_SECONDS:
+                changed, last_sync = everything, time.monotonic()
+
+    # Pick up the final upload, including an unterminated last line
+    _print_new_lines()
+    if partial:
+        line = partial.decode(errors="replace")
+        print(line)
+        tail.append(line)
+
+    return "\n".join(tail)
+
+
+# Full re-check interval when following via notifications
+_RESYNC_SECONDS = 300
+
+
+@contextmanager
+def _log_watcher(run_id: str):
+    """Yield a notifications.PrefixWatcher for the run, or None to poll."""
+    if not S3_NOTIFY:
+        yield None
+        return
+    from .notifications import watch_prefix
+    with watch_prefix(_s3_key(run_id, "")) as watcher:
+        yield watcher
 
 
 def get_run_s3_prefix(run_id: str) -> str:
@@ -196,72 +483,397 @@ def get_run_s3_prefix(run_id: str) -> str:
 
 
 def cleanup(run_id: str) -> None:
-    """Remove all S3 objects for a run."""
-    s3_uri = f"{_s3_prefix(run_id)}/"
-    subprocess.run(
-        ["aws", "s3", "rm", "--recursive", s3_uri, "--region", AWS_REGION],
-        capture_output=True, timeout=120,
-    )
+    """Remove all S3 objects for a run.
+
+    Each listing page (up to 1000 keys) becomes one DeleteObjects request;
+    deletes run on a small pool so they overlap with listing further pages.
+    """
+    client = _get_s3_client()
+    paginator = client.get_paginator("list_objects_v2")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = []
+        for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=_s3_key(run_id, "")):
+            objects = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if objects:
+                futures.append(pool.submit(
+                    client.delete_objects,
+                    Bucket=S3_BUCKET,
+                    Delete={"Objects": objects, "Quiet": True},
+                ))
+        for future in futures:
+            future.result()
 
 
 # ---------------------------------------------------------------------------
 # Internal helpers
 # ---------------------------------------------------------------------------
 
+# (project, HEAD sha, index mtime_ns) -> file list; see _git_tracked_files
+_GIT_FILES_CACHE: dict[tuple, list[str]] = {}
+
+
 def _git_tracked_files(project: Path) -> Optional[list[str]]:
-    """Return list of git-tracked files, or None if not a git repo."""
+    """Return list of git-tracked files, or None if not a git repo.
+
+    Memoized per process on (HEAD, index mtime): repeat launches from an
+    unchanged checkout skip the worktree walk. Untracked files created
+    after the first call are only picked up once HEAD or the index changes.
+    """
     try:
-        result = subprocess.run(
-            ["git", "ls-files", "--cached", "--others", "--exclude-standard"],
+        head = subprocess.run(
+            ["git", "rev-parse", "--absolute-git-dir", "HEAD"],
             capture_output=True, text=True, cwd=str(project), timeout=30,
         )
-        if result.returncode == 0:
-            return [f for f in result.stdout.strip().splitlines() if f]
     except (subprocess.TimeoutExpired, FileNotFoundError):
-        pass
+        return None
+    cache_key = None
+    lines = head.stdout.splitlines()  # one per arg; the git dir may contain spaces
+    if head.returncode == 0 and len(lines) >= 2:
+        git_dir, sha = lines[:2]
+        try:
+            index_mtime = os.stat(os.path.join(git_dir, "index")).st_mtime_ns
+        except OSError:
+            index_mtime = None  # can't tell when the listing goes stale: don't cache
+        if index_mtime is not None:
+            cache_key = (str(project.resolve()), sha, index_mtime)
+            if cache_key in _GIT_FILES_CACHE:
+                return list(_GIT_FILES_CACHE[cache_key])
+
+    try:
+        result = subprocess.run(
+            ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            capture_output=True, cwd=str(project), timeout=30,
+        )
+    except (subprocess.TimeoutExpired, FileNotFoundError):
+        return None
+    if result.returncode != 0:
+        return None
+    files = [os.fsdecode(f) for f in result.stdout.split(b"\0") if f]
+    if cache_key is not None:
+        _GIT_FILES_CACHE[cache_key] = files
+    return list(files)
+
+
+def _archive_codec(total_bytes: int) -> str:
+    """Pick the code archive format (".tar", ".tar.zst" or ".tar.gz") by tree size.
+
+    Source trees under _COMPRESS_ABOVE_BYTES ship as plain tar: compressing
+    them saves little transfer time but costs a full pass on both ends.
+    Larger trees use multithreaded zstd -1 when installed, else gzip -1.
+    """
+    if total_bytes < _COMPRESS_ABOVE_BYTES:
+        return ".tar"
+    if shutil.which("zstd") and shutil.which("tar"):
+        return ".tar.zst"
+    return ".tar.gz"
+
+
+def _compress_command(suffix: str) -> Optional[list[str]]:
+    """Compressor command (stdin -> stdout) for an archive suffix; None for plain tar."""
+    if suffix == ".tar.zst":
+        return ["zstd", "-1", "-T0", "-q", "-c"]
+    if suffix == ".tar.gz":
+        return _gzip_command()
+    return None
+
+
+def _gzip_command() -> Optional[list[str]]:
+    """Return the fastest available gzip compressor command (stdin -> stdout)."""
+    if shutil.which("pigz"):
+        return ["pigz", "-p", str(os.cpu_count() or 1), "-1"]
+    if shutil.which("gzip"):
+        return ["gzip", "-1", "-c"]
     return None
 
 
-def _create_tar_from_list(root: Path, files: list[str], output: str) -> None:
-    """Create a tar.gz from a list of relative file paths."""
-    with tarfile.open(output, "w:gz") as tar:
+def _create_tar_from_list(root: Path, files: list[str], output, suffix: str = ".tar.gz") -> None:
+    """Write a tar of relative file paths to a binary file object.
+
+    ``suffix`` selects the codec (see _archive_codec). Pipes `tar` through
+    the compressor straight into ``output``'s fd so compression runs on
+    all cores outside the GIL. Falls back to tarfile when the tools are
+    missing or ``output`` has no file descriptor.
+    """
+    compress = _compress_command(suffix)
+    try:
+        out_fd = output.fileno()
+    except (AttributeError, OSError):
+        out_fd = None
+    if (out_fd is None or shutil.which("tar") is None
+            or (compress is None and suffix != ".tar")):
+        _tarfile_from_list(root, files, output, plain=suffix == ".tar")
+        return
+
+    names = b"".join(
+        os.fsencode(f) + b"\0" for f in files if (root / f).is_file()
+    )
+    tar_cmd = ["tar", "-cf", "-", "-C", str(root), "--null", "-T", "-"]
+    if compress is None:
+        tar = subprocess.Popen(tar_cmd, stdin=subprocess.PIPE, stdout=out_fd)
+        compressor = None
+    else:
+        tar = subprocess.Popen(tar_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        compressor = subprocess.Popen(compress, stdin=tar.stdout, stdout=out_fd)
+        tar.stdout.close()  # compressor holds the only read end now
+    try:
+        tar.stdin.write(names)
+    finally:
+        tar.stdin.close()
+    tar_rc = tar.wait()
+    comp_rc = compressor.wait() if compressor is not None else 0
+    if tar_rc == 1 and comp_rc == 0:
+        # GNU tar: a file changed while being read. The archive is complete
+        # (tarfile also archived such files without complaint).
+        warnings.warn("tar: some files changed while the code archive was created", stacklevel=2)
+    elif tar_rc != 0 or comp_rc != 0:
+        raise RuntimeError(
+            f"Creating code archive failed (tar exit {tar_rc}, "
+            f"{compress[0] if compress else 'compressor'} exit {comp_rc})"
+        )
+
+
+def _tarfile_from_list(root: Path, files: list[str], output, plain: bool = False) -> None:
+    """Pure-Python fallback for _create_tar_from_list."""
+    with tarfile.open(fileobj=output, mode="w|" if plain else "w|gz") as tar:
         for f in files:
             full = root / f
             if full.is_file():
                 tar.add(str(full), arcname=f)
 
 
-def _create_tar_from_dir(root: Path, output: str, exclude: list[str]) -> None:
-    """Create a tar.gz from a directory, excluding patterns."""
+# Common large/irrelevant dirs, pruned at any depth
+_SKIP_DIRS = (".git", "__pycache__", "node_modules", ".venv")
+_SKIP_DIRS_RE = r"(?:^|/)(?:" + "|".join(map(re.escape, _SKIP_DIRS)) + r")(?:/|$)"
+_SKIP_TOP = frozenset(f"./{d}" for d in _SKIP_DIRS)
+
+
+def _create_tar_from_dir(root: Path, output, exclude: list[str]) -> None:
+    """Write a streaming tar.gz of a directory to a binary file object, excluding patterns."""
+    # One compiled scan per entry instead of a Python loop over patterns.
+    # Matching a skip dir's own entry prunes its whole subtree.
+    pattern = _SKIP_DIRS_RE
+    if exclude:
+        pattern += "|" + "|".join(map(re.escape, exclude))
+    skip = re.compile(pattern).search
+
     def _filter(info: tarfile.TarInfo) -> Optional[tarfile.TarInfo]:
-        for pat in exclude:
-            if pat in info.name:
-                return None
-        # Skip common large/irrelevant dirs
-        for skip in [".git/", "__pycache__/", "node_modules/", ".venv/"]:
-            if skip in info.name:
-                return None
+        name = info.name
+        if name in _SKIP_TOP or skip(name):
+            return None
         return info
 
-    with tarfile.open(output, "w:gz") as tar:
+    with tarfile.open(fileobj=output, mode="w|gz") as tar:
         tar.add(str(root), arcname=".", filter=_filter)
 
 
-def _aws_s3_cp(local_path: str, s3_uri: str) -> None:
-    """Copy a local file to S3."""
-    result = subprocess.run(
-        ["aws", "s3", "cp", local_path, s3_uri, "--region", AWS_REGION],
-        capture_output=True, text=True, timeout=300,
-    )
-    if result.returncode != 0:
-        raise RuntimeError(f"S3 upload failed: {result.stderr}")
+def _object_exists(key: str) -> bool:
+    """HeadObject existence check (no body download)."""
+    client = _get_s3_client()
+    try:
+        client.head_object(Bucket=S3_BUCKET, Key=key)
+    except client.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+    return True
+
+
+def _read_object(key: str) -> Optional[str]:
+    """Return an object's body as text, or None if the key does not exist."""
+    if S3_USE_CLI:
+        result = subprocess.run(
+            ["aws", "s3", "cp", f"s3://{S3_BUCKET}/{key}", "-", "--region", AWS_REGION],
+            capture_output=True, text=True, timeout=15,
+        )
+        return result.stdout if result.returncode == 0 else None
+    client = _get_s3_client()
+    try:
+        resp = client.get_object(Bucket=S3_BUCKET, Key=key)
+    except client.exceptions.NoSuchKey:
+        return None
+    return resp["Body"].read().decode(errors="replace")
+
+
+@functools.lru_cache(maxsize=1)
+def _have_awscrt() -> bool:
+    """True when the AWS CRT bindings are installed."""
+    try:
+        import awscrt  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _transfer_config(*, stream: bool = False, object_bytes: Optional[int] = None):
+    """Managed-transfer settings; prefers the awscrt transfer client when installed.
+
+    Non-seekable streams (stream=True) stay on the classic threaded client,
+    which uploads pipe input part by part. When object_bytes (the size of
+    the largest object) is known, parts are sized to about _TARGET_PARTS
+    per object, within S3's part size limits, and concurrency grows with
+    the part count. S3_TARGET_THROUGHPUT_GBPS, when set, overrides concurrency.
+    """
+    from boto3.s3.transfer import TransferConfig
+    kwargs = dict(multipart_chunksize=8 * 1024 * 1024, max_concurrency=20)
+    if object_bytes:
+        chunk = min(_MAX_PART_SIZE, max(_MIN_PART_SIZE, object_bytes // _TARGET_PARTS))
+        kwargs.update(
+            multipart_chunksize=chunk,
+            multipart_threshold=chunk,
+            max_concurrency=max(20, min(100, object_bytes // chunk + 1)),
+        )
+    if S3_TARGET_THROUGHPUT_GBPS > 0:
+        mb_per_second = S3_TARGET_THROUGHPUT_GBPS * 1000 / 8
+        kwargs["max_concurrency"] = min(
+            100, max(1, math.ceil(mb_per_second / _MB_PER_SECOND_PER_CONNECTION)),
+        )
+    if _have_awscrt() and not stream:
+        kwargs["preferred_transfer_client"] = "crt"
+    return TransferConfig(**kwargs)
+
+
+def _upload_fileobj(fileobj, key: str, *, size_hint: Optional[int] = None) -> None:
+    """Stream a readable file object to S3 as a multipart upload."""
+    try:
+        _get_s3_client().upload_fileobj(
+            fileobj, S3_BUCKET, key,
+            Config=_transfer_config(stream=True, object_bytes=size_hint),
+        )
+    except Exception as e:
+        raise RuntimeError(f"S3 upload failed: {e}") from e
+
+
+def _split_s3_uri(uri: str) -> tuple[str, str]:
+    """Split s3://bucket/prefix into (bucket, prefix)."""
+    bucket, _, prefix = uri[len("s3://"):].partition("/")
+    return bucket, prefix
+
+
+def _walk_files(root: str):
+    """Yield (path, relative posix path) for every regular file under root."""
+    stack = [(root, "")]
+    while stack:
+        base, rel = stack.pop()
+        with os.scandir(base) as it:
+            for entry in it:
+                entry_rel = f"{rel}{entry.name}"
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, entry_rel + "/"))
+                elif entry.is_file():
+                    yield entry.path, entry_rel
+
+
+def _transfer_many(jobs, upload: bool, largest_bytes: Optional[int] = None) -> None:
+    """Run (local_path, bucket, key) transfers through one CRT-backed manager.
+
+    Parts are sized from ``largest_bytes``, the biggest single object. At
+    most _MAX_IN_FLIGHT transfers are queued at a time.
+    """
+    from boto3.s3.transfer import create_transfer_manager
+
+    in_flight: collections.deque = collections.deque()
+    config = _transfer_config(object_bytes=largest_bytes)
+    with create_transfer_manager(_get_s3_client(), config) as manager:
+        for local_path, bucket, key in jobs:
+            if upload:
+                future = manager.upload(local_path, bucket, key)
+            else:
+                future = manager.download(bucket, key, local_path)
+            in_flight.append(future)
+            if len(in_flight) >= _MAX_IN_FLIGHT:
+                in_flight.popleft().result()
+        for future in in_flight:
+            future.result()
+
+
+def _parallel_upload_dir(src: str, dst: str) -> None:
+    """Upload every file under src to dst without listing the destination."""
+    bucket, prefix = _split_s3_uri(dst)
+    # Listed up front so the largest file can drive part sizing
+    jobs = [(path, bucket, prefix + rel) for path, rel in _walk_files(src)]
+    largest = max((os.path.getsize(path) for path, _, _ in jobs), default=0)
+    _transfer_many(jobs, upload=True, largest_bytes=largest)
+
+
+def _crt_sync_download(src: str, dst: str) -> None:
+    bucket, prefix = _split_s3_uri(src)
+    paginator = _get_s3_client().get_paginator("list_objects_v2")
+
+    jobs = []
+    mtimes = []
+    largest = 0
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            rel = obj["Key"][len(prefix):]
+            if not rel or rel.endswith("/"):
+                continue
+            local = Path(dst) / rel
+            modified = obj["LastModified"].timestamp()
+            # Like `aws s3 sync`: skip when the size matches and the local
+            # copy is not older than the object
+            try:
+                st = local.stat()
+                if st.st_size == obj["Size"] and st.st_mtime >= modified:
+                    continue
+            except OSError:
+                pass
+            local.parent.mkdir(parents=True, exist_ok=True)
+            jobs.append((str(local), bucket, obj["Key"]))
+            mtimes.append(modified)
+            largest = max(largest, obj["Size"])
+
+    _transfer_many(jobs, upload=False, largest_bytes=largest)
+    # Stamp downloads with the object's time so the next sync can compare
+    for (local_path, _, _), modified in zip(jobs, mtimes):
+        os.utime(local_path, (modified, modified))
 
 
 def _aws_s3_sync(src: str, dst: str) -> None:
-    """Sync between local and S3 (either direction)."""
+    """Sync between local and S3 (either direction).
+
+    Uses parallel CRT transfers when awscrt is installed, otherwise
+    shells out to `aws s3 sync`.
+    """
+    if _have_awscrt():
+        try:
+            if dst.startswith("s3://"):
+                _parallel_upload_dir(src, dst)
+            else:
+                _crt_sync_download(src, dst)
+        except Exception as e:
+            raise RuntimeError(f"S3 sync failed: {e}") from e
+        return
+
     result = subprocess.run(
-        ["aws", "s3", "sync", src, dst, "--region", AWS_REGION],
+        ["aws", "s3", "sync", src, dst, "--region", AWS_REGION, *_cli_endpoint_args()],
         capture_output=True, text=True, timeout=600,
     )
     if result.returncode != 0:
         raise RuntimeError(f"S3 sync failed: {result.stderr}")
+
+
+def _upload_dir(src: str, dst: str) -> None:
+    """Copy a local tree to a fresh S3 prefix.
+
+    Run prefixes are empty at upload time, so unlike `aws s3 sync` there is
+    no destination listing or size/mtime diff: every file is put directly.
+    """
+    if S3_USE_CLI:
+        result = subprocess.run(
+            ["aws", "s3", "cp", src, dst, "--recursive", "--region", AWS_REGION,
+             *_cli_endpoint_args()],
+            capture_output=True, text=True, timeout=600,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"S3 upload failed: {result.stderr}")
+        return
+    try:
+        _parallel_upload_dir(src, dst)
+    except Exception as e:
+        raise RuntimeError(f"S3 upload failed: {e}") from e
+
+
+def _cli_endpoint_args() -> list[str]:
+    if S3_ACCELERATE and _bucket_accelerated():
+        return ["--endpoint-url", "https://s3-accelerate.amazonaws.com"]
+    return []
@@ -91,8 +91,8 @@ WATCHDOG_PID=$!
         sleep 60
         _sync_counter=$((_sync_counter + 1))
 
-        # Heartbeat: write UTC timestamp to S3 (every 60s)
-        date -u +%Y-%m-%dT%H:%M:%SZ | aws s3 cp - "${S3_BASE}/heartbeat" --region "$AWS_DEFAULT_REGION" --quiet 2>/dev/null || true
+        # Heartbeat: write UTC epoch seconds to S3 (every 60s)
+        date -u +%s | aws s3 cp - "${S3_BASE}/heartbeat" --region "$AWS_DEFAULT_REGION" --quiet 2>/dev/null || true
 
         # Log: upload current log file (every 60s)
         aws s3 cp "$LOGFILE" "${S3_BASE}/experiment.log" --region "$AWS_DEFAULT_REGION" --quiet 2>/dev/null || true
@@ -73,9 +73,16 @@ echo "started" | aws s3 cp - "${S3_BASE}/status" --region "$AWS_DEFAULT_REGION"
 # -----------------------------------------------------------------------
 echo "=== Pulling code from S3 ==="
 mkdir -p "$WORKDIR"
-aws s3 cp "${S3_BASE}/code.tar.gz" /tmp/code.tar.gz --region "$AWS_DEFAULT_REGION"
-tar xzf /tmp/code.tar.gz -C "$WORKDIR"
-rm /tmp/code.tar.gz
+aws s3 cp "${S3_BASE}/code.tar" /tmp/code.tar --region "$AWS_DEFAULT_REGION"
+# code.tar may be plain, gzip or zstd (by tree size); tar detects the codec
+# from the magic bytes, but zstd needs its binary
+if [ "$(head -c 4 /tmp/code.tar | od -An -tx1 | tr -d ' \n')" = "28b52ffd" ] \
+        && ! command -v zstd &>/dev/null; then
+    apt-get install -y -qq zstd >/dev/null 2>&1 \
+        || { apt-get update -qq && apt-get install -y -qq zstd; } >/dev/null 2>&1 || true
+fi
+tar xf /tmp/code.tar -C "$WORKDIR"
+rm /tmp/code.tar
 
 echo "=== Pulling data from S3 ==="
 if aws s3 ls "${S3_BASE}/data/" --region "$AWS_DEFAULT_REGION" 2>/dev/null; then
@@ -2,6 +2,12 @@
 
 Provides per-project visibility into which cloud instances are running,
 complementing the global ~/.orchestration-kit-cloud/runs/ state.
+
+Mutations are appended as one-line events to .kit/cloud-state.jsonl, so a
+register/update/remove costs one O_APPEND write instead of a full rewrite.
+Readers replay the journal over the .kit/cloud-state.json snapshot; once
+the journal grows past _COMPACT_AFTER_BYTES it is folded back into the
+snapshot and truncated.
 """
 
 from __future__ import annotations
@@ -9,48 +15,199 @@ from __future__ import annotations
 import json
 import os
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Optional
 
+try:
+    import fcntl
+except ImportError:  # Windows: appends stay atomic, compaction is unlocked
+    fcntl = None
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
 
 STATE_FILENAME = ".kit/cloud-state.json"
+JOURNAL_FILENAME = ".kit/cloud-state.jsonl"
+
+# Journal size at which the next mutation compacts it into the snapshot
+_COMPACT_AFTER_BYTES = 64 * 1024
+
+# project_root -> (file signature, loaded state); see _load
+_LOAD_CACHE: dict[str, tuple[tuple, dict]] = {}
+
+
+def _loads(raw: bytes):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _dumps(obj, indent: bool = False) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode()
 
 
 def _state_path(project_root: str) -> Path:
     return Path(project_root) / STATE_FILENAME
 
 
-def _load(project_root: str) -> dict:
-    """Load state file; return empty structure on missing or corrupt JSON."""
-    path = _state_path(project_root)
-    if not path.exists():
-        return {"active_runs": {}}
+def _journal_path(project_root: str) -> Path:
+    return Path(project_root) / JOURNAL_FILENAME
+
+
+def _load_snapshot(project_root: str) -> dict:
+    """Load snapshot file; return empty structure on missing or corrupt JSON."""
     try:
-        data = json.loads(path.read_text())
+        data = _loads(_state_path(project_root).read_bytes())
         if not isinstance(data, dict) or "active_runs" not in data:
             return {"active_runs": {}}
         return data
-    except (json.JSONDecodeError, OSError):
+    except (ValueError, OSError):
         return {"active_runs": {}}
 
 
+def _apply(data: dict, event: dict) -> None:
+    """Apply one journal event to loaded state in place."""
+    runs = data["active_runs"]
+    op = event.get("op")
+    run_id = event.get("run_id")
+    if op == "put":
+        runs[run_id] = event["entry"]
+    elif op == "update":
+        if run_id in runs:
+            runs[run_id].update(event["updates"])
+    elif op == "remove":
+        runs.pop(run_id, None)
+
+
+def _file_sig(path: Path) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _load(project_root: str) -> dict:
+    """Load the snapshot and replay the journal over it.
+
+    The result is cached per project until either file's inode, size or
+    mtime changes, so repeated reads in one process skip parsing.
+    """
+    sig = (_file_sig(_state_path(project_root)), _file_sig(_journal_path(project_root)))
+    cached = _LOAD_CACHE.get(project_root)
+    if cached is None or cached[0] != sig:
+        data = _load_snapshot(project_root)
+        try:
+            with open(_journal_path(project_root), "rb") as f:
+                for line in f:
+                    try:
+                        _apply(data, _loads(line))
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        continue  # torn or foreign line — skip it
+        except OSError:
+            pass
+        cached = _LOAD_CACHE[project_root] = (sig, data)
+    data = cached[1]
+    return {**data, "active_runs": dict(data["active_runs"])}
+
+
 def _save(project_root: str, data: dict) -> None:
     """Atomic write via temp file + rename."""
     path = _state_path(project_root)
     path.parent.mkdir(parents=True, exist_ok=True)
-    fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+    payload = _dumps(data, indent=True) + b"\n"
+    if not _save_tmpfile(path, payload):
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, str(path))
+        except Exception:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+    _LOAD_CACHE.pop(project_root, None)
+
+
+def _save_tmpfile(path: Path, payload: bytes) -> bool:
+    """Linux fast path for _save: write an anonymous O_TMPFILE inode, then name it.
+
+    The file only gets a directory entry once fully written, so a crash
+    leaves nothing behind. Returns False where O_TMPFILE or linking via
+    /proc is unavailable so the caller can fall back to mkstemp.
+    """
+    if not hasattr(os, "O_TMPFILE"):
+        return False
+    dir_fd = os.open(str(path.parent), os.O_RDONLY | os.O_DIRECTORY)
     try:
-        with os.fdopen(fd, "w") as f:
-            json.dump(data, f, indent=2)
-            f.write("\n")
-        os.replace(tmp, str(path))
-    except Exception:
         try:
-            os.unlink(tmp)
+            fd = os.open(".", os.O_TMPFILE | os.O_WRONLY, 0o644, dir_fd=dir_fd)
         except OSError:
-            pass
-        raise
+            return False  # filesystem without O_TMPFILE support
+        tmp = f"{path.name}.{os.getpid()}.tmp"
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            # dst_dir_fd routes through linkat(AT_SYMLINK_FOLLOW), which
+            # resolves the /proc fd link to the anonymous inode
+            try:
+                try:
+                    os.link(f"/proc/self/fd/{fd}", tmp, dst_dir_fd=dir_fd)
+                except FileExistsError:  # left by a crashed process with our pid
+                    os.unlink(tmp, dir_fd=dir_fd)
+                    os.link(f"/proc/self/fd/{fd}", tmp, dst_dir_fd=dir_fd)
+            except OSError:
+                return False  # no /proc, or linking disallowed
+        try:
+            os.replace(tmp, path.name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        except Exception:
+            try:
+                os.unlink(tmp, dir_fd=dir_fd)
+            except OSError:
+                pass
+            raise
+        return True
+    finally:
+        os.close(dir_fd)
+
+
+@contextmanager
+def _locked_journal(project_root: str, exclusive: bool):
+    """Open the journal for appending, holding a shared or exclusive flock."""
+    path = _journal_path(project_root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield fd
+    finally:
+        os.close(fd)
+
+
+def _append(project_root: str, *events: dict) -> None:
+    """Append events to the journal; compact it once it grows too large."""
+    payload = b"".join(_dumps(e) + b"\n" for e in events)
+    with _locked_journal(project_root, exclusive=False) as fd:
+        os.write(fd, payload)
+        size = os.fstat(fd).st_size
+    if size > _COMPACT_AFTER_BYTES:
+        _compact(project_root)
+
+
+def _compact(project_root: str) -> None:
+    """Fold the journal into the snapshot and truncate it."""
+    with _locked_journal(project_root, exclusive=True) as fd:
+        _save(project_root, _load(project_root))
+        os.ftruncate(fd, 0)
 
 
 def register_run(
@@ -66,8 +223,7 @@ def register_run(
     batch_id: Optional[str] = None,
 ) -> None:
     """Record a newly-provisioned run in project-local state."""
-    data = _load(project_root)
-    data["active_runs"][run_id] = {
+    entry = {
         "instance_id": instance_id,
         "backend": backend,
         "instance_type": instance_type,
@@ -77,14 +233,12 @@ def register_run(
         "registered_at": datetime.now(timezone.utc).isoformat(),
         "batch_id": batch_id or "",
     }
-    _save(project_root, data)
+    _append(project_root, {"op": "put", "run_id": run_id, "entry": entry})
 
 
 def remove_run(project_root: str, run_id: str) -> None:
     """Remove a run from project-local state (completed or terminated)."""
-    data = _load(project_root)
-    data["active_runs"].pop(run_id, None)
-    _save(project_root, data)
+    _append(project_root, {"op": "remove", "run_id": run_id})
 
 
 def list_active_runs(project_root: str) -> list[dict]:
@@ -107,10 +261,7 @@ def get_run(project_root: str, run_id: str) -> Optional[dict]:
 
 def update_run(project_root: str, run_id: str, **updates) -> None:
     """Merge updates into an existing run entry. No-op if run_id not found."""
-    data = _load(project_root)
-    if run_id in data["active_runs"]:
-        data["active_runs"][run_id].update(updates)
-        _save(project_root, data)
+    _append(project_root, {"op": "update", "run_id": run_id, "updates": updates})
 
 
 def list_batch_runs(project_root: str, batch_id: str) -> list[dict]:
@@ -123,56 +274,66 @@ def list_batch_runs(project_root: str, batch_id: str) -> list[dict]:
     return results
 
 
+# gc_stale verdicts for a single run
+_GC_KEEP = "keep"
+_GC_EXIT_SEEN = "exit_seen"
+_GC_STALE = "stale"
+
+
+def _gc_check_one(s3_mod, run_id: str, entry: dict) -> str:
+    """Decide whether one active run should be garbage-collected.
+
+    One marker listing answers both the exit_code and heartbeat questions.
+    """
+    try:
+        markers = s3_mod.list_run_markers(run_id)
+    except Exception:
+        markers = None
+
+    # Check if exit_code exists in S3
+    if markers is not None and "exit_code" in markers:
+        return _GC_EXIT_SEEN
+
+    # Check if older than 24h with no heartbeat
+    launched = entry.get("launched_at") or entry.get("registered_at")
+    if launched:
+        try:
+            launched_dt = datetime.fromisoformat(launched.replace("Z", "+00:00"))
+            age = datetime.now(timezone.utc) - launched_dt
+            if age.total_seconds() > 24 * 3600:
+                # Check heartbeat
+                if markers is None or "heartbeat" not in markers:
+                    return _GC_STALE
+        except (ValueError, TypeError):
+            pass
+    return _GC_KEEP
+
+
 def gc_stale(project_root: str) -> int:
-    """Garbage-collect stale entries in project-local cloud-state.json.
+    """Garbage-collect stale entries in project-local cloud state.
 
     For each entry with status "running" or "pending":
     - If exit_code exists in S3, update local state to match.
     - If older than 24h with no heartbeat, mark as stale.
+    Runs are checked concurrently; each check is one S3 marker listing.
     Returns count of cleaned entries.
     """
     from cloud import s3 as s3_mod
 
-    data = _load(project_root)
-    cleaned = 0
-    to_remove = []
-
-    for run_id, entry in list(data["active_runs"].items()):
-        # Check if exit_code exists in S3
-        try:
-            exit_code = s3_mod.check_exit_code(run_id)
-            if exit_code is not None:
-                to_remove.append(run_id)
-                cleaned += 1
-                continue
-        except Exception:
-            pass
-
-        # Check if older than 24h with no heartbeat
-        launched = entry.get("launched_at") or entry.get("registered_at")
-        if launched:
-            try:
-                launched_dt = datetime.fromisoformat(launched.replace("Z", "+00:00"))
-                age = datetime.now(timezone.utc) - launched_dt
-                if age.total_seconds() > 24 * 3600:
-                    # Check heartbeat
-                    try:
-                        hb = s3_mod.check_heartbeat(run_id)
-                        if hb is None:
-                            to_remove.append(run_id)
-                            cleaned += 1
-                            continue
-                    except Exception:
-                        to_remove.append(run_id)
-                        cleaned += 1
-                        continue
-            except (ValueError, TypeError):
-                pass
+    active = list(_load(project_root)["active_runs"].items())
+    if not active:
+        return 0
 
-    for run_id in to_remove:
-        data["active_runs"].pop(run_id, None)
+    with ThreadPoolExecutor(max_workers=min(32, len(active))) as pool:
+        futures = {
+            pool.submit(_gc_check_one, s3_mod, run_id, entry): run_id
+            for run_id, entry in active
+        }
+        to_remove = [
+            futures[f] for f in as_completed(futures) if f.result() != _GC_KEEP
+        ]
 
     if to_remove:
-        _save(project_root, data)
+        _append(project_root, *({"op": "remove", "run_id": r} for r in to_remove))
 
-    return cleaned
+    return len(to_remove)
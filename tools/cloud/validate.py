@@ -1,97 +1,575 @@
 """Pre-flight validation for experiment scripts before cloud execution."""
 
 import ast
+import atexit
+import functools
+import hashlib
+import importlib.machinery
+import importlib.util
+import json
 import os
+import queue
 import subprocess
 import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Optional
 
+from . import config
 
-def syntax_check(script: str) -> tuple[bool, str]:
-    """Check syntax of a Python script. Returns (ok, message)."""
+
+# Stdlib and builtin top-level names: always importable, never probed.
+# (sys.stdlib_module_names is Python 3.10+.)
+_STDLIB = frozenset(getattr(sys, "stdlib_module_names", ())) | frozenset(sys.builtin_module_names)
+
+
+# Probe outcomes as (isolated, module), reused until sys.path, the working
+# directory or PYTHONPATH changes (see _sync_import_cache)
+_IMPORT_OK: set[tuple[bool, str]] = set()
+_IMPORT_BAD: set[tuple[bool, str]] = set()
+_IMPORT_CACHE_ENV: Optional[tuple] = None
+
+# (blake2b of source, script dir, timeout) -> (smoke_test result, monotonic time),
+# least recently used evicted first; failures are re-run after the TTL
+_SMOKE_CACHE: "OrderedDict[tuple, tuple[tuple[bool, str], float]]" = OrderedDict()
+_SMOKE_CACHE_SIZE = 256
+_SMOKE_FAILURE_TTL = 60.0
+
+# (script path, blake2b of source) -> syntax_check result, oldest evicted first
+_SYNTAX_CACHE: "OrderedDict[tuple[str, bytes], tuple[bool, str]]" = OrderedDict()
+_SYNTAX_CACHE_SIZE = 4096
+
+
+def _read_source(script: str) -> bytes:
+    """Read a script's bytes with raw syscalls (open, fstat, read, close).
+
+    Scripts are small, so this is normally one read sized from fstat,
+    without the io stack's buffer objects. Keeps reading until EOF in case
+    the size was wrong (a growing file, or 0 for special files).
+    """
+    fd = os.open(script, os.O_RDONLY | getattr(os, "O_BINARY", 0))
     try:
-        with open(script) as f:
-            source = f.read()
-        compile(source, script, "exec")
+        size = os.fstat(fd).st_size
+        chunks = []
+        while True:
+            chunk = os.read(fd, max(size, 65536))
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+
+
+def _parse(script: str, source: bytes,
+           compile_check: bool = True) -> tuple[Optional[ast.Module], Optional[Exception]]:
+    """Parse source once; returns (tree, None) or (None, error).
+
+    The tree feeds the import scan. With ``compile_check`` the tree is
+    also compiled (without re-parsing) so errors raised only by the
+    compiler, such as 'return' outside a function or a bad nonlocal,
+    fail the syntax check too.
+    """
+    try:
+        tree = compile(source, script, "exec", ast.PyCF_ONLY_AST, dont_inherit=True)
+        if compile_check:
+            compile(tree, script, "exec", dont_inherit=True)
+        return tree, None
+    except (SyntaxError, ValueError) as e:  # ValueError: NUL bytes before 3.12
+        return None, e
+
+
+def _syntax_result(error: Optional[Exception]) -> tuple[bool, str]:
+    if error is None:
         return True, "Syntax OK"
-    except SyntaxError as e:
-        return False, f"SyntaxError: {e}"
+    if isinstance(error, SyntaxError):
+        return False, f"SyntaxError: {error}"
+    return False, str(error)
+
+
+def syntax_check(script: str, source: Optional[bytes] = None) -> tuple[bool, str]:
+    """Check syntax of a Python script. Returns (ok, message).
+
+    Pass ``source`` to reuse bytes already read. Results are memoized on
+    the source contents, so re-checking an unchanged script is free.
+    """
+    try:
+        if source is None:
+            source = _read_source(script)
     except Exception as e:
         return False, str(e)
 
+    key = (script, hashlib.blake2b(source, digest_size=16).digest())
+    cached = _SYNTAX_CACHE.get(key)
+    if cached is not None:
+        return cached
+    result = _syntax_result(_parse(script, source)[1])
+    _SYNTAX_CACHE[key] = result
+    if len(_SYNTAX_CACHE) > _SYNTAX_CACHE_SIZE:
+        _SYNTAX_CACHE.popitem(last=False)
+    return result
 
-def import_check(script: str) -> tuple[bool, str]:
-    """AST-parse the script, extract imports, verify each is importable."""
-    try:
-        with open(script) as f:
-            tree = ast.parse(f.read())
-    except SyntaxError as e:
-        return False, f"Parse error: {e}"
-
-    modules = set()
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Import):
-            for alias in node.names:
-                modules.add(alias.name.split('.')[0])
-        elif isinstance(node, ast.ImportFrom):
-            if node.module:
-                modules.add(node.module.split('.')[0])
 
+# ast.match_case exists from Python 3.10
+_MATCH_CASE = getattr(ast, "match_case", ast.stmt)
+
+
+class _ImportCollector(ast.NodeVisitor):
+    """Collect top-level absolute imports of a module.
+
+    Function and class bodies are skipped (imports there are lazy and not
+    needed to start the script), as are relative imports. Only statement
+    lists are descended into, so expressions are never visited.
+    """
+
+    def __init__(self):
+        self.modules: set[str] = set()
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            self.modules.add(alias.name.partition(".")[0])
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        if node.level == 0 and node.module:
+            self.modules.add(node.module.partition(".")[0])
+
+    def visit_FunctionDef(self, node: ast.AST) -> None:
+        pass
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
+
+    def generic_visit(self, node: ast.AST) -> None:
+        # Imports are statements: follow only nested statement blocks
+        # (if/try/with/for bodies, except handlers, match cases)
+        for _, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                for item in value:
+                    if isinstance(item, (ast.stmt, ast.excepthandler, _MATCH_CASE)):
+                        self.visit(item)
+
+
+def import_check(script: str, source: Optional[bytes] = None, *,
+                 tree: Optional[ast.Module] = None,
+                 isolated: bool = False) -> tuple[bool, str]:
+    """Parse the script, extract imports, verify each is importable.
+
+    Pass ``tree`` to reuse an existing parse. Modules are located
+    in-process with importlib.util.find_spec, which consults the import
+    finders without executing anything. Pass isolated=True to instead
+    import each module in a fresh interpreter (slower, but also catches
+    modules that are found yet fail to import).
+    """
+    if tree is None:
+        if source is None:
+            source = _read_source(script)
+        tree, error = _parse(script, source, compile_check=False)
+        if tree is None:
+            return False, f"Parse error: {error}"
+    collector = _ImportCollector()
+    collector.visit(tree)
+    modules = collector.modules
+
+    _sync_import_cache()
+    to_probe = set()
     missing = []
-    for mod in sorted(modules):
-        try:
-            result = subprocess.run(
-                [sys.executable, "-c", f"import {mod}"],
-                capture_output=True, text=True, timeout=10
-            )
-            if result.returncode != 0:
-                missing.append(mod)
-        except subprocess.TimeoutExpired:
-            missing.append(f"{mod} (timeout)")
+    for mod in modules - _STDLIB:
+        if (isolated, mod) in _IMPORT_BAD:
+            missing.append(mod)
+        elif (isolated, mod) not in _IMPORT_OK:
+            to_probe.add(mod)
+
+    failed = []
+    if isolated:
+        if to_probe:
+            failed = _probe_imports_isolated(to_probe)
+    else:
+        failed = [mod for mod in to_probe if not _find_module(mod)]
+    failed_set = set(failed)
+    for mod in to_probe:
+        if mod in failed_set:
+            _IMPORT_BAD.add((isolated, mod))
+        elif f"{mod} (timeout)" not in failed_set:  # timeouts are not cached
+            _IMPORT_OK.add((isolated, mod))
+    missing.extend(failed)
 
     if missing:
-        return False, f"Missing imports: {', '.join(missing)}"
+        # Probing order is arbitrary; sort only for a stable message
+        return False, f"Missing imports: {', '.join(sorted(missing))}"
     return True, f"All {len(modules)} imports OK"
 
 
-def smoke_test(script: str, timeout: int = 300) -> tuple[bool, str]:
+def _sync_import_cache() -> None:
+    """Drop cached probe results if the import environment changed."""
+    global _IMPORT_CACHE_ENV
+    env = (tuple(sys.path), os.getcwd(), os.environ.get("PYTHONPATH", ""))
+    if env != _IMPORT_CACHE_ENV:
+        _IMPORT_OK.clear()
+        _IMPORT_BAD.clear()
+        _stop_probe_server()  # restarted with the new environment on demand
+        _IMPORT_CACHE_ENV = env
+
+
+def _find_module(mod: str) -> bool:
+    """True if a top-level module can be located without importing it."""
+    try:
+        if importlib.util.find_spec(mod) is not None:
+            return True
+        # `python -c` probes also saw the working directory on sys.path
+        return importlib.machinery.PathFinder.find_spec(mod, [os.getcwd()]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+# Long-lived probe interpreter: reads module names from stdin, imports each
+# and answers b"OK" / b"ERR" on the original stdout. fd 1 is pointed at
+# stderr (discarded) so import-time prints can't corrupt the protocol.
+# Replies are raw bytes on an unbuffered fd; nothing is decoded either side.
+_PROBE_SERVER = """\
+import importlib, os, sys
+out = os.fdopen(os.dup(1), "wb", 0)
+os.dup2(2, 1)
+for line in sys.stdin.buffer:
+    try:
+        importlib.import_module(line.strip().decode())
+        out.write(b"OK\\n")
+    except BaseException:
+        out.write(b"ERR\\n")
+"""
+
+# Interpreter for probes and smoke tests, bound once at import. Not
+# realpath'd: a venv's python must keep its own path to find pyvenv.cfg.
+_PY = sys.executable
+_PROBE_ARGV = (_PY, "-u", "-c", _PROBE_SERVER)
+
+# Per-module import timeout in the probe interpreter
+_PROBE_TIMEOUT = 10
+
+
+class _ProbeServer:
+    """A probe interpreter plus a reader thread feeding its replies to a queue."""
+
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            _PROBE_ARGV,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            # Our own interpreter, not an untrusted child; since PEP 446 only
+            # explicitly inheritable fds leak anyway. close_fds=False lets
+            # CPython take the posix_spawn fast path instead of fork+exec.
+            close_fds=False,
+        )
+        self._replies: queue.Queue = queue.Queue()
+        threading.Thread(target=self._pump, name="import-probe", daemon=True).start()
+
+    def _pump(self) -> None:
+        for line in self.proc.stdout:
+            self._replies.put(line)
+        self._replies.put(None)  # EOF: interpreter exited
+
+    def probe(self, mod: str, timeout: float) -> str:
+        """Return "ok", "err", "timeout" or "dead" (the interpreter exited)."""
+        try:
+            self.proc.stdin.write(mod.encode() + b"\n")
+            self.proc.stdin.flush()
+        except OSError:
+            return "dead"
+        try:
+            reply = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            return "timeout"
+        if reply is None:
+            return "dead"
+        return "ok" if reply == b"OK\n" else "err"
+
+    def close(self) -> None:
+        self.proc.kill()
+        self.proc.wait()
+
+
+_PROBE: Optional[_ProbeServer] = None
+_PROBE_LOCK = threading.Lock()
+
+
+def _probe_imports_isolated(modules: Iterable[str]) -> list[str]:
+    """Import modules in the shared probe interpreter; return failure labels.
+
+    Interpreter startup is paid once per process rather than per check. A
+    module that hangs or kills the interpreter is reported and the
+    interpreter is replaced before the next module.
+    """
+    global _PROBE
+    missing = []
+    with _PROBE_LOCK:
+        for mod in modules:
+            if _PROBE is None:
+                _PROBE = _ProbeServer()
+            status = _PROBE.probe(mod, _PROBE_TIMEOUT)
+            if status == "ok":
+                continue
+            if status == "timeout":
+                missing.append(f"{mod} (timeout)")
+            else:
+                missing.append(mod)
+            if status in ("timeout", "dead"):
+                _PROBE.close()
+                _PROBE = None
+    return missing
+
+
+def _stop_probe_server() -> None:
+    global _PROBE
+    with _PROBE_LOCK:
+        if _PROBE is not None:
+            _PROBE.close()
+            _PROBE = None
+
+
+atexit.register(_stop_probe_server)
+
+
+def smoke_test(script: str, timeout: int = 300, source: Optional[bytes] = None,
+               cancel: Optional[threading.Event] = None) -> tuple[bool, str]:
     """Run `python <script> --smoke-test` with timeout.
 
     The script should support --smoke-test flag that runs a minimal
     forward pass (1 batch, CPU/MPS) and exits.
+
+    Results are memoized on the script's contents and resolved directory
+    (which the script imports siblings from); failures expire after
+    _SMOKE_FAILURE_TTL seconds so transient errors get retried. Setting
+    ``cancel`` kills a running test; the cancelled result is not cached.
     """
+    key = None
     try:
-        env = {**os.environ, "CUDA_VISIBLE_DEVICES": ""}
-        result = subprocess.run(
-            [sys.executable, script, "--smoke-test"],
-            capture_output=True, text=True, timeout=timeout,
-            env=env
+        if source is None:
+            source = _read_source(script)
+        key = (
+            hashlib.blake2b(source, digest_size=16).digest(),
+            os.path.dirname(os.path.realpath(script)),
+            timeout,
         )
-        if result.returncode == 0:
-            return True, "Smoke test passed"
-        err_lines = result.stderr.strip().split('\n')
-        return False, "Smoke test failed:\n" + '\n'.join(err_lines[-20:])
-    except subprocess.TimeoutExpired:
-        return False, f"Smoke test timeout after {timeout}s"
+    except OSError:
+        pass  # let the interpreter report the unreadable script
+    if key is not None and key in _SMOKE_CACHE:
+        result, at = _SMOKE_CACHE[key]
+        if result[0] or time.monotonic() - at < _SMOKE_FAILURE_TTL:
+            _SMOKE_CACHE.move_to_end(key)
+            return result
+
+    result = _run_smoke(script, timeout, cancel)
+    if key is not None and not (cancel is not None and cancel.is_set()):
+        _SMOKE_CACHE[key] = (result, time.monotonic())
+        _SMOKE_CACHE.move_to_end(key)
+        if len(_SMOKE_CACHE) > _SMOKE_CACHE_SIZE:
+            _SMOKE_CACHE.popitem(last=False)
+    return result
+
+
+# Lines of smoke-test stderr kept for the failure message
+_SMOKE_TAIL_LINES = 20
+
+
+# How often a running smoke test checks its cancel event
+_SMOKE_CANCEL_POLL = 0.1
+
+
+@functools.lru_cache(maxsize=1)
+def _smoke_env() -> dict[str, str]:
+    """Smoke-test environment (CPU only), built once per process.
+
+    os.environ is captured on first use; call _smoke_env.cache_clear()
+    after changing it.
+    """
+    return {**os.environ, "CUDA_VISIBLE_DEVICES": ""}
+
+
+def _run_smoke(script: str, timeout: int,
+               cancel: Optional[threading.Event] = None) -> tuple[bool, str]:
+    proc = subprocess.Popen(
+        [_PY, script, "--smoke-test"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        text=True, errors="replace", env=_smoke_env(),
+    )
+    # Drain stderr as it arrives, keeping only the tail: memory stays
+    # bounded and the pipe never fills however much the script logs
+    tail: deque[str] = deque(maxlen=_SMOKE_TAIL_LINES)
+    reader = threading.Thread(
+        target=lambda: tail.extend(line.rstrip("\n") for line in proc.stderr),
+        name="smoke-stderr", daemon=True,
+    )
+    reader.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                returncode = proc.wait(
+                    timeout=remaining if cancel is None else min(remaining, _SMOKE_CANCEL_POLL))
+                break
+            except subprocess.TimeoutExpired:
+                if cancel is not None and cancel.is_set():
+                    proc.kill()
+                    proc.wait()
+                    return False, "Smoke test cancelled"
+                if time.monotonic() >= deadline:
+                    proc.kill()
+                    proc.wait()
+                    return False, f"Smoke test timeout after {timeout}s"
+    finally:
+        reader.join(1)
+        proc.stderr.close()
+    if returncode == 0:
+        return True, "Smoke test passed"
+    return False, "Smoke test failed:\n" + "\n".join(tail).strip()
+
+
+# config.VALIDATE_CACHE: "<realpath>\0<skip_smoke>" -> [mtime_ns, size, results]
+# for passing runs, loaded on first use and written back at exit
+_DISK_CACHE: Optional[dict] = None
+_DISK_CACHE_DIRTY = False
+
+
+def _disk_cache() -> dict:
+    global _DISK_CACHE
+    if _DISK_CACHE is None:
+        try:
+            with open(config.VALIDATE_CACHE_PATH, "rb") as f:
+                _DISK_CACHE = json.load(f)
+        except (OSError, ValueError):
+            _DISK_CACHE = {}
+        atexit.register(_save_disk_cache)
+    return _DISK_CACHE
+
+
+def _save_disk_cache() -> None:
+    global _DISK_CACHE_DIRTY
+    if not _DISK_CACHE_DIRTY:
+        return
+    path = config.VALIDATE_CACHE_PATH
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(_DISK_CACHE, f)
+        os.replace(tmp, path)
+        _DISK_CACHE_DIRTY = False
+    except OSError:
+        pass  # best effort: the cache is only an accelerator
+
+
+def _disk_cache_key(script: str, skip_smoke: bool) -> tuple[str, list[int]]:
+    st = os.stat(script)
+    return f"{os.path.realpath(script)}\0{int(skip_smoke)}", [st.st_mtime_ns, st.st_size]
+
+
+def _cached_validation(script: str, skip_smoke: bool):
+    """Return cached validate_all results if the script is unchanged, else None."""
+    if not config.VALIDATE_CACHE:
+        return None
+    try:
+        key, stamp = _disk_cache_key(script, skip_smoke)
+    except OSError:
+        return None
+    entry = _disk_cache().get(key)
+    if entry is None or entry[:2] != stamp:
+        return None
+    return True, [tuple(check) for check in entry[2]]
+
+
+def _store_validation(script: str, skip_smoke: bool, all_passed: bool, results: list) -> None:
+    global _DISK_CACHE_DIRTY
+    # Failures are never cached: they are usually fixed outside the script
+    if not config.VALIDATE_CACHE or not all_passed:
+        return
+    try:
+        key, stamp = _disk_cache_key(script, skip_smoke)
+    except OSError:
+        return
+    _disk_cache()[key] = [*stamp, results]
+    _DISK_CACHE_DIRTY = True
 
 
 def validate_all(script: str, skip_smoke: bool = False) -> tuple[bool, list[tuple[str, bool, str]]]:
-    """Run all validation checks. Returns (all_passed, [(check_name, passed, message), ...])."""
+    """Run all validation checks. Returns (all_passed, [(check_name, passed, message), ...]).
+
+    With config.VALIDATE_CACHE set, a script that passed before and whose
+    size and mtime are unchanged is not re-checked.
+    """
+    cached = _cached_validation(script, skip_smoke)
+    if cached is not None:
+        return cached
+    all_passed, results = _validate_uncached(script, skip_smoke)
+    _store_validation(script, skip_smoke, all_passed, results)
+    return all_passed, results
+
+
+def _validate_uncached(script: str, skip_smoke: bool) -> tuple[bool, list[tuple[str, bool, str]]]:
     results = []
 
-    ok, msg = syntax_check(script)
-    results.append(("syntax", ok, msg))
-    if not ok:
+    try:
+        source = _read_source(script)
+    except OSError as e:
+        results.append(("syntax", False, str(e)))
         return False, results
 
-    ok, msg = import_check(script)
-    results.append(("imports", ok, msg))
+    # One parse answers the syntax check and feeds the import scan
+    tree, error = _parse(script, source)
+    ok, msg = _syntax_result(error)
+    results.append(("syntax", ok, msg))
     if not ok:
         return False, results
 
-    if not skip_smoke:
-        ok, msg = smoke_test(script)
-        results.append(("smoke_test", ok, msg))
+    if skip_smoke:
+        ok, msg = import_check(script, tree=tree)
+        results.append(("imports", ok, msg))
+        return ok, results
+
+    # The smoke test runs alongside the import check and is cancelled if
+    # imports fail, so a passing script costs max(imports, smoke)
+    cancel = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        smoke = pool.submit(smoke_test, script, source=source, cancel=cancel)
+        try:
+            ok, msg = import_check(script, tree=tree)
+        except BaseException:
+            cancel.set()
+            raise
+        results.append(("imports", ok, msg))
         if not ok:
+            cancel.set()
             return False, results
+        ok, msg = smoke.result()
+    results.append(("smoke_test", ok, msg))
+    return ok, results
+
+
+# Below this many scripts, pool startup costs more than it saves
+_BATCH_MIN_PARALLEL = 4
 
-    return True, results
+
+def validate_all_batch(
+    scripts: list[str], skip_smoke: bool = False, workers: Optional[int] = None,
+) -> dict[str, tuple[bool, list[tuple[str, bool, str]]]]:
+    """Run validate_all on many scripts in parallel worker processes.
+
+    Returns {script: validate_all(script)}. Small batches run serially in
+    this process (which also keeps this process's caches warm).
+    """
+    run_one = functools.partial(validate_all, skip_smoke=skip_smoke)
+    if len(scripts) < _BATCH_MIN_PARALLEL:
+        return {script: run_one(script) for script in scripts}
+    # Disk-cache hits are answered here; workers exit without running atexit
+    # hooks, so their results are recorded by this process
+    out = {}
+    for script in scripts:
+        cached = _cached_validation(script, skip_smoke)
+        if cached is not None:
+            out[script] = cached
+    todo = [script for script in scripts if script not in out]
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            for script, result in zip(todo, pool.map(run_one, todo)):
+                _store_validation(script, skip_smoke, *result)
+                out[script] = result
+    return {script: out[script] for script in scripts}